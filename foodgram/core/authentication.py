@@ -0,0 +1,103 @@
+from hashlib import sha256
+
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import (TokenAuthentication,
+                                           get_authorization_header)
+from rest_framework.exceptions import AuthenticationFailed
+
+from .caches import is_shared_cache
+from .consts import TOKEN_CACHE_TIMEOUT
+
+TOKEN_CACHE_HITS = 'auth-token:hits'
+TOKEN_CACHE_MISSES = 'auth-token:misses'
+
+
+def _token_key(key):
+    return f'auth-token:{sha256(key.encode()).hexdigest()}'
+
+
+def _count(name):
+    try:
+        cache.incr(name)
+    except ValueError:
+        cache.add(name, 1, None)
+
+
+async def _acount(name):
+    try:
+        await cache.aincr(name)
+    except ValueError:
+        await cache.aadd(name, 1, None)
+
+
+def invalidate_tokens(*keys):
+    cache.delete_many([_token_key(key) for key in keys])
+
+
+def token_cache_stats():
+    stats = cache.get_many((TOKEN_CACHE_HITS, TOKEN_CACHE_MISSES))
+    hits = stats.get(TOKEN_CACHE_HITS, 0)
+    misses = stats.get(TOKEN_CACHE_MISSES, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / total if total else None,
+    }
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    cache_timeout = TOKEN_CACHE_TIMEOUT
+
+    def authenticate_credentials(self, key):
+        if not is_shared_cache():
+            return super().authenticate_credentials(key)
+        cache_key = _token_key(key)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            _count(TOKEN_CACHE_HITS)
+            return self._check_active(*cached)
+        _count(TOKEN_CACHE_MISSES)
+        user, token = super().authenticate_credentials(key)
+        cache.set(cache_key, (user, token), self.cache_timeout)
+        return user, token
+
+    async def aauthenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise AuthenticationFailed(_('Invalid token header.'))
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise AuthenticationFailed(_('Invalid token header.'))
+        return await self.aauthenticate_credentials(key)
+
+    async def aauthenticate_credentials(self, key):
+        if not is_shared_cache():
+            return await self._aget_token(key)
+        cache_key = _token_key(key)
+        cached = await cache.aget(cache_key)
+        if cached is not None:
+            await _acount(TOKEN_CACHE_HITS)
+            return self._check_active(*cached)
+        await _acount(TOKEN_CACHE_MISSES)
+        user, token = await self._aget_token(key)
+        await cache.aset(cache_key, (user, token), self.cache_timeout)
+        return user, token
+
+    async def _aget_token(self, key):
+        model = self.get_model()
+        try:
+            token = await model.objects.select_related('user').aget(key=key)
+        except model.DoesNotExist:
+            raise AuthenticationFailed(_('Invalid token.'))
+        return self._check_active(token.user, token)
+
+    @staticmethod
+    def _check_active(user, token):
+        if not user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        return user, token
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Warning
+
+PROCESS_LOCAL_BACKENDS = (LocMemCache, DummyCache)
+
+
+def is_shared_cache(alias='default'):
+    return not isinstance(caches[alias], PROCESS_LOCAL_BACKENDS)
+
+
+def check_shared_cache(app_configs=None, **kwargs):
+    if settings.DEBUG:
+        return []
+    errors = []
+    if not is_shared_cache():
+        errors.append(Warning(
+            'Кэш по умолчанию не разделяется между процессами: версии '
+            'справочников и сброс токенов не дойдут до других воркеров',
+            hint='Укажите CACHE_BACKEND='
+                 'django.core.cache.backends.redis.RedisCache и '
+                 'CACHE_LOCATION',
+            id='foodgram.W001',
+        ))
+    if not is_shared_cache('metrics'):
+        errors.append(Warning(
+            'Кэш метрик не разделяется между процессами: /api/metrics/ '
+            'покажет только запросы одного воркера',
+            hint='Укажите METRICS_CACHE_BACKEND='
+                 'django.core.cache.backends.redis.RedisCache и '
+                 'METRICS_CACHE_LOCATION',
+            id='foodgram.W002',
+        ))
+    return errors
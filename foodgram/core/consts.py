@@ -1,2 +1,48 @@
 MIN_COOK_AMOUNT_TIME = 1
 MAX_COOK_AMOUNT_TIME = 32000
+
+BULK_RECIPES_LIMIT = 100
+BULK_ADDED = 'added'
+BULK_EXISTS = 'exists'
+BULK_REMOVED = 'removed'
+BULK_NOT_FOUND = 'not_found'
+
+TAGS_VERSION = 'tags'
+INGREDIENTS_VERSION = 'ingredients'
+
+MEMBERSHIP_CACHE_TIMEOUT = 60 * 60
+FAVORITES = 'favorites'
+SHOPPING_CART = 'shopping_cart'
+FOLLOWING = 'following'
+
+IMAGE_VARIANT_WIDTHS = (320, 640, 1280)
+IMAGE_VARIANT_FORMATS = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+IMAGE_VARIANT_QUALITY = 80
+IMAGE_VARIANTS_POLL_INTERVAL = 5
+
+IMAGE_UPLOAD_TOKEN_TIMEOUT = 60 * 60 * 24
+IMAGE_UPLOAD_CLAIM_TIMEOUT = 60
+IMAGE_UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+
+RECIPES_VERSION = 'recipes'
+ANONYMOUS_CACHE_TIMEOUT = 60 * 5
+ANONYMOUS_CACHE_STALE_TIMEOUT = 60 * 60
+ANONYMOUS_CACHE_LOCK_TIMEOUT = 10
+ANONYMOUS_CACHE_WAIT = 0.05
+ANONYMOUS_CACHE_WAIT_ATTEMPTS = 10
+
+ADMIN_EXACT_COUNT_LIMIT = 10000
+
+TOKEN_CACHE_TIMEOUT = 60 * 5
+
+METRICS_FLUSH_INTERVAL = 15
+METRICS_LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+METRICS_QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+METRICS_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+METRICS_METHODS = ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS')
+METRICS_ROUTE_STATUSES = 5
@@ -1,25 +1,34 @@
+from django import forms
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
+from rest_framework.exceptions import ValidationError
 
-from recipes.models import Ingredient, Tag, Recipe
+from recipes.models import Recipe
+from recipes.tag_slugs import tag_slug_choices, tag_slug_map
+from .consts import BULK_RECIPES_LIMIT
 
+RecipeTag = Recipe.tags.through
+TAGS_MATCH_ANY = 'any'
+TAGS_MATCH_ALL = 'all'
+TAGS_MATCH_CHOICES = (
+    (TAGS_MATCH_ANY, TAGS_MATCH_ANY),
+    (TAGS_MATCH_ALL, TAGS_MATCH_ALL),
+)
 
-class CustomFilterIngredient(filters.FilterSet):
-    name = filters.CharFilter(
-        field_name='name',
-        lookup_expr='istartswith'
-    )
 
-    class Meta:
-        model = Ingredient
-        fields = ('name', )
+class IntegerInFilter(filters.BaseInFilter, filters.Filter):
+    field_class = forms.IntegerField
 
 
 class CustomFlterRecipeTags(filters.FilterSet):
 
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_slug_choices,
+        method='filter_tags'
+    )
+    tags_match = filters.ChoiceFilter(
+        choices=TAGS_MATCH_CHOICES,
+        method='filter_tags_match'
     )
     is_favorited = filters.BooleanFilter(
         method='filter_is_favorited'
@@ -30,16 +39,46 @@ class CustomFlterRecipeTags(filters.FilterSet):
     author = filters.NumberFilter(
         method='filter_author'
     )
+    search = filters.CharFilter(
+        method='filter_search'
+    )
+    ids = IntegerInFilter(
+        method='filter_ids'
+    )
 
     class Meta:
         model = Recipe
         fields = [
             'author',
             'tags',
+            'tags_match',
             'is_favorited',
-            'is_in_shopping_cart'
+            'is_in_shopping_cart',
+            'search',
+            'ids'
         ]
 
+    def filter_queryset(self, queryset):
+        ids = self.form.cleaned_data.get('ids')
+        if 'ids' in self.data and (not ids or None in ids):
+            raise ValidationError({
+                'ids': ['Укажите id рецептов через запятую']
+            })
+        return super().filter_queryset(queryset)
+
+    def filter_tags(self, queryset, name, value):
+        tag_ids = tag_slug_map.ids(value)
+        if self.form.cleaned_data.get('tags_match') != TAGS_MATCH_ALL:
+            return queryset.filter(Exists(RecipeTag.objects.filter(
+                recipe_id=OuterRef('pk'), tag_id__in=tag_ids)))
+        for tag_id in tag_ids:
+            queryset = queryset.filter(Exists(RecipeTag.objects.filter(
+                recipe_id=OuterRef('pk'), tag_id=tag_id)))
+        return queryset
+
+    def filter_tags_match(self, queryset, name, value):
+        return queryset
+
     def filter_is_favorited(self, queryset, u, value):
         user = self.request.user
         if value and user.is_authenticated:
@@ -57,3 +96,14 @@ class CustomFlterRecipeTags(filters.FilterSet):
         if value and user.is_authenticated:
             return queryset.filter(author=value)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        return queryset.search(value)
+
+    def filter_ids(self, queryset, name, value):
+        ids = list(dict.fromkeys(value))
+        if len(ids) > BULK_RECIPES_LIMIT:
+            raise ValidationError({
+                name: [f'Не больше {BULK_RECIPES_LIMIT} рецептов за запрос']
+            })
+        return queryset.in_id_order(ids)
@@ -0,0 +1,90 @@
+from time import time_ns
+
+from django.core.cache import cache
+
+from recipes.models import Favorite, ShoppingCart
+from users.models import Subscribe
+from .consts import (FAVORITES,
+                     FOLLOWING,
+                     MEMBERSHIP_CACHE_TIMEOUT,
+                     SHOPPING_CART)
+
+MEMBERSHIP_QUERIES = {
+    FAVORITES: lambda user_id: Favorite.objects.filter(
+        user_id=user_id).order_by().values_list('recipe_id', flat=True),
+    SHOPPING_CART: lambda user_id: ShoppingCart.objects.filter(
+        user_id=user_id).order_by().values_list('recipe_id', flat=True),
+    FOLLOWING: lambda user_id: Subscribe.objects.filter(
+        user_id=user_id).order_by().values_list('author_id', flat=True),
+}
+
+
+def _version_key(user_id, kind):
+    return f'membership:{kind}:{user_id}:version'
+
+
+def _membership_key(user_id, kind, version):
+    return f'membership:{kind}:{user_id}:{version}'
+
+
+def _membership_version(user_id, kind):
+    key = _version_key(user_id, kind)
+    cache.add(key, str(time_ns()), MEMBERSHIP_CACHE_TIMEOUT)
+    return cache.get(key)
+
+
+async def _amembership_version(user_id, kind):
+    key = _version_key(user_id, kind)
+    await cache.aadd(key, str(time_ns()), MEMBERSHIP_CACHE_TIMEOUT)
+    return await cache.aget(key)
+
+
+def _request_membership(request):
+    membership = getattr(request, '_membership', None)
+    if membership is None:
+        membership = request._membership = {}
+    return membership
+
+
+def get_member_ids(request, kind):
+    user = request.user
+    if not user.is_authenticated:
+        return frozenset()
+    membership = _request_membership(request)
+    if kind not in membership:
+        key = _membership_key(
+            user.id, kind, _membership_version(user.id, kind))
+        ids = cache.get(key)
+        if ids is None:
+            ids = frozenset(MEMBERSHIP_QUERIES[kind](user.id))
+            cache.set(key, ids, MEMBERSHIP_CACHE_TIMEOUT)
+        membership[kind] = ids
+    return membership[kind]
+
+
+async def aget_member_ids(request, kind):
+    user = request.user
+    if not user.is_authenticated:
+        return frozenset()
+    membership = _request_membership(request)
+    if kind not in membership:
+        key = _membership_key(
+            user.id, kind, await _amembership_version(user.id, kind))
+        ids = await cache.aget(key)
+        if ids is None:
+            ids = frozenset(
+                [obj_id async for obj_id in MEMBERSHIP_QUERIES[kind](user.id)])
+            await cache.aset(key, ids, MEMBERSHIP_CACHE_TIMEOUT)
+        membership[kind] = ids
+    return membership[kind]
+
+
+def is_member(request, kind, obj_id):
+    return obj_id in get_member_ids(request, kind)
+
+
+def invalidate_member_ids(user_id, kind, request=None):
+    cache.set(
+        _version_key(user_id, kind), str(time_ns()), MEMBERSHIP_CACHE_TIMEOUT)
+    if request is not None:
+        _request_membership(request).pop(kind, None)
@@ -0,0 +1,248 @@
+import re
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from functools import lru_cache
+from hashlib import sha1
+from threading import Lock
+from time import monotonic, perf_counter
+
+from django.core.cache import caches
+from django.db.backends.signals import connection_created
+from django.utils.connection import ConnectionProxy
+
+from .consts import (METRICS_FLUSH_INTERVAL,
+                     METRICS_LATENCY_BUCKETS,
+                     METRICS_METHODS,
+                     METRICS_QUERY_BUCKETS,
+                     METRICS_ROUTE_STATUSES,
+                     METRICS_SIZE_BUCKETS)
+
+SERIES_COUNT = 'metrics:series'
+LABELS = ('method', 'route', 'status')
+HISTOGRAMS = (
+    ('duration', 'foodgram_http_request_duration_seconds',
+     'Время обработки запроса', METRICS_LATENCY_BUCKETS, 1000000),
+    ('queries', 'foodgram_http_request_db_queries',
+     'Число SQL-запросов за запрос', METRICS_QUERY_BUCKETS, 1),
+    ('size', 'foodgram_http_response_size_bytes',
+     'Размер тела ответа', METRICS_SIZE_BUCKETS, 1),
+)
+COUNTERS = (
+    ('db_time', 'foodgram_http_request_db_duration_seconds_total',
+     'Суммарное время SQL-запросов', 1000000),
+)
+UNMATCHED_ROUTE = '<unmatched>'
+OTHER_METHOD = 'OTHER'
+
+current_metrics = ContextVar('current_metrics', default=None)
+cache = ConnectionProxy(caches, 'metrics')
+
+
+def _incr(key, delta):
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        if cache.add(key, delta, None):
+            return delta
+        return cache.incr(key, delta)
+
+
+def _escape(value):
+    return (str(value).replace('\\', '\\\\')
+            .replace('"', '\\"').replace('\n', '\\n'))
+
+
+def _label_text(labels):
+    return ','.join(
+        f'{label}="{_escape(value)}"' for label, value in zip(LABELS, labels))
+
+
+def _format(value, scale=1):
+    if scale != 1:
+        value /= scale
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+@lru_cache(maxsize=None)
+def _route_label(route):
+    route = re.sub(r'\(\?P<(\w+)>[^)]*\)', r'<\1>', route)
+    route = re.sub(r'<\w+:(\w+)>', r'<\1>', route)
+    return route.replace('^', '').replace('$', '')
+
+
+class MetricsRegistry:
+
+    def __init__(self, flush_interval=METRICS_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self.lock = Lock()
+        self.pending = Counter()
+        self.series = {}
+        self.statuses = defaultdict(set)
+        self.unregistered = {}
+        self.flushed = monotonic()
+
+    def _bound_labels(self, method, route, status):
+        if method not in METRICS_METHODS:
+            method = OTHER_METHOD
+        statuses = self.statuses[method, route]
+        if status not in statuses:
+            if len(statuses) < METRICS_ROUTE_STATUSES:
+                statuses.add(status)
+            else:
+                status = f'{status[0]}xx'
+        return method, route, status
+
+    def observe(self, labels, histograms, counters):
+        with self.lock:
+            labels = self._bound_labels(*labels)
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = sha1(
+                    '\0'.join(labels).encode()).hexdigest()
+                self.unregistered[series] = labels
+            for metric, _, _, buckets, scale in HISTOGRAMS:
+                value = histograms.get(metric)
+                if value is None:
+                    continue
+                index = bisect_left(buckets, value)
+                self.pending[f'metrics:{series}:{metric}:{index}'] += 1
+                self.pending[
+                    f'metrics:{series}:{metric}:sum'] += round(value * scale)
+            for metric, _, _, scale in COUNTERS:
+                self.pending[f'metrics:{series}:{metric}'] += round(
+                    counters[metric] * scale)
+
+    def is_due(self):
+        return monotonic() - self.flushed >= self.flush_interval
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+            unregistered, self.unregistered = self.unregistered, {}
+            self.flushed = monotonic()
+        for series, labels in unregistered.items():
+            if cache.add(f'metrics:{series}', labels, None):
+                cache.set(
+                    f'metrics:slot:{_incr(SERIES_COUNT, 1)}', series, None)
+        for key, delta in pending.items():
+            if delta:
+                _incr(key, delta)
+
+    def collect(self):
+        self.flush()
+        slots = cache.get_many([
+            f'metrics:slot:{slot}'
+            for slot in range(1, cache.get(SERIES_COUNT, 0) + 1)
+        ])
+        labels = cache.get_many([
+            f'metrics:{series}' for series in slots.values()])
+        series = sorted(
+            (labels[f'metrics:{series}'], series)
+            for series in set(slots.values())
+            if f'metrics:{series}' in labels
+        )
+        keys = []
+        for _, name in series:
+            for metric, _, _, buckets, _ in HISTOGRAMS:
+                keys.extend(
+                    f'metrics:{name}:{metric}:{index}'
+                    for index in range(len(buckets) + 1))
+                keys.append(f'metrics:{name}:{metric}:sum')
+            keys.extend(
+                f'metrics:{name}:{counter[0]}' for counter in COUNTERS)
+        values = cache.get_many(keys)
+        return ''.join(self._render(series, values))
+
+    @staticmethod
+    def _render(series, values):
+        for metric, name, help_text, buckets, scale in HISTOGRAMS:
+            yield f'# HELP {name} {help_text}\n# TYPE {name} histogram\n'
+            for labels, key in series:
+                label_text = _label_text(labels)
+                total = 0
+                for index, bound in enumerate((*buckets, '+Inf')):
+                    total += values.get(f'metrics:{key}:{metric}:{index}', 0)
+                    yield (f'{name}_bucket{{{label_text},'
+                           f'le="{_format(bound)}"}} {total}\n')
+                value_sum = values.get(f'metrics:{key}:{metric}:sum', 0)
+                yield (f'{name}_sum{{{label_text}}} '
+                       f'{_format(value_sum, scale)}\n')
+                yield f'{name}_count{{{label_text}}} {total}\n'
+        for metric, name, help_text, scale in COUNTERS:
+            yield f'# HELP {name} {help_text}\n# TYPE {name} counter\n'
+            for labels, key in series:
+                label_text = _label_text(labels)
+                value = values.get(f'metrics:{key}:{metric}', 0)
+                yield f'{name}{{{label_text}}} {_format(value, scale)}\n'
+
+
+registry = MetricsRegistry()
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += perf_counter() - started
+
+
+def _install_query_recorder(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+connection_created.connect(_install_query_recorder)
+
+
+class RequestMetrics:
+
+    def __init__(self, request):
+        self.request = request
+        self.queries = 0
+        self.db_time = 0
+        current_metrics.set(self)
+        self.started = perf_counter()
+
+    def finish(self, response, size=None):
+        duration = perf_counter() - self.started
+        if current_metrics.get() is self:
+            current_metrics.set(None)
+        if size is None and not response.streaming:
+            size = len(response.content)
+        match = self.request.resolver_match
+        registry.observe(
+            (self.request.method,
+             _route_label(match.route) if match else UNMATCHED_ROUTE,
+             str(response.status_code)),
+            {'duration': duration, 'queries': self.queries, 'size': size},
+            {'db_time': self.db_time})
+
+    def wrap_stream(self, response):
+        content = response.streaming_content
+
+        if response.is_async:
+            async def stream():
+                size = 0
+                try:
+                    async for chunk in content:
+                        size += len(chunk)
+                        yield chunk
+                finally:
+                    self.finish(response, size)
+        else:
+            def stream():
+                size = 0
+                try:
+                    for chunk in content:
+                        size += len(chunk)
+                        yield chunk
+                finally:
+                    self.finish(response, size)
+
+        response.streaming_content = stream()
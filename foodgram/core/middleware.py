@@ -0,0 +1,70 @@
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.decorators import sync_and_async_middleware
+
+from .metrics import RequestMetrics, registry
+from .nplusone import detect_nplusone
+
+
+@sync_and_async_middleware
+def asgi_urlconf_middleware(get_response):
+    if not iscoroutinefunction(get_response):
+        return get_response
+
+    async def middleware(request):
+        request.urlconf = settings.ASGI_URLCONF
+        return await get_response(request)
+
+    return middleware
+
+
+def _record(metrics, response):
+    if response.streaming:
+        metrics.wrap_stream(response)
+    else:
+        metrics.finish(response)
+    return response
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    if iscoroutinefunction(get_response):
+        flush = sync_to_async(registry.flush, thread_sensitive=False)
+
+        async def middleware(request):
+            response = _record(
+                RequestMetrics(request), await get_response(request))
+            if registry.is_due():
+                await flush()
+            return response
+    else:
+        def middleware(request):
+            response = _record(RequestMetrics(request), get_response(request))
+            if registry.is_due():
+                registry.flush()
+            return response
+
+    return middleware
+
+
+@sync_and_async_middleware
+def nplusone_middleware(get_response):
+    if not settings.NPLUSONE_DETECTION:
+        raise MiddlewareNotUsed
+
+    def detect(request):
+        return detect_nplusone(
+            f'{request.method} {request.path}',
+            raise_error=settings.NPLUSONE_RAISE)
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            with detect(request):
+                return await get_response(request)
+    else:
+        def middleware(request):
+            with detect(request):
+                return get_response(request)
+
+    return middleware
@@ -0,0 +1,188 @@
+from asyncio import sleep as async_sleep
+from hashlib import md5
+from time import sleep, time
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from .consts import (ANONYMOUS_CACHE_LOCK_TIMEOUT,
+                     ANONYMOUS_CACHE_STALE_TIMEOUT,
+                     ANONYMOUS_CACHE_TIMEOUT,
+                     ANONYMOUS_CACHE_WAIT,
+                     ANONYMOUS_CACHE_WAIT_ATTEMPTS)
+from .versions import (aget_versions,
+                       get_version,
+                       get_versions,
+                       version_etag,
+                       version_timestamp)
+
+MISS = 'MISS'
+HIT = 'HIT'
+STALE = 'STALE'
+
+
+class VersionedPayload:
+    renderer = JSONRenderer()
+
+    def __init__(self):
+        self.cached = (None, None)
+
+    def response(self, version, get_data):
+        cached_version, payload = self.cached
+        if payload is None or cached_version != version:
+            payload = self.renderer.render(get_data())
+            self.cached = (version, payload)
+        return HttpResponse(payload, content_type=self.renderer.media_type)
+
+    async def aresponse(self, version, get_data):
+        cached_version, payload = self.cached
+        if payload is None or cached_version != version:
+            payload = self.renderer.render(await get_data())
+            self.cached = (version, payload)
+        return HttpResponse(payload, content_type=self.renderer.media_type)
+
+
+class AnonymousCache:
+
+    def __init__(self, name, versions, timeout=ANONYMOUS_CACHE_TIMEOUT):
+        self.name = name
+        self.versions = versions
+        self.timeout = timeout
+
+    def key(self, request):
+        params = sorted(
+            (name, sorted(values))
+            for name, values in request.GET.lists()
+        )
+        digest = md5(
+            f'{request.scheme}:{request.get_host()}:{request.path}:{params}'
+            .encode()
+        ).hexdigest()
+        return f'anonymous:{self.name}:{digest}'
+
+    @staticmethod
+    def is_fresh(entry, versions):
+        return (entry is not None
+                and entry['versions'] == versions
+                and entry['expires'] > time())
+
+    def entry(self, versions, data):
+        return {
+            'versions': versions,
+            'expires': time() + self.timeout,
+            'data': data,
+        }
+
+    def get(self, request, get_data):
+        key = self.key(request)
+        versions = get_versions(self.versions)
+        entry = cache.get(key)
+        if self.is_fresh(entry, versions):
+            return entry['data'], HIT
+        lock_key = f'{key}:lock'
+        if not cache.add(lock_key, True, ANONYMOUS_CACHE_LOCK_TIMEOUT):
+            if entry is not None:
+                return entry['data'], STALE
+            for _ in range(ANONYMOUS_CACHE_WAIT_ATTEMPTS):
+                sleep(ANONYMOUS_CACHE_WAIT)
+                entry = cache.get(key)
+                if entry is not None:
+                    return entry['data'], HIT
+            return get_data(), MISS
+        try:
+            data = get_data()
+            cache.set(
+                key, self.entry(versions, data), ANONYMOUS_CACHE_STALE_TIMEOUT)
+        finally:
+            cache.delete(lock_key)
+        return data, MISS
+
+    async def aget(self, request, get_data):
+        key = self.key(request)
+        versions = await aget_versions(self.versions)
+        entry = await cache.aget(key)
+        if self.is_fresh(entry, versions):
+            return entry['data'], HIT
+        lock_key = f'{key}:lock'
+        if not await cache.aadd(lock_key, True, ANONYMOUS_CACHE_LOCK_TIMEOUT):
+            if entry is not None:
+                return entry['data'], STALE
+            for _ in range(ANONYMOUS_CACHE_WAIT_ATTEMPTS):
+                await async_sleep(ANONYMOUS_CACHE_WAIT)
+                entry = await cache.aget(key)
+                if entry is not None:
+                    return entry['data'], HIT
+            return await get_data(), MISS
+        try:
+            data = await get_data()
+            await cache.aset(
+                key, self.entry(versions, data), ANONYMOUS_CACHE_STALE_TIMEOUT)
+        finally:
+            await cache.adelete(lock_key)
+        return data, MISS
+
+
+class VersionedListMixin:
+    version_name = None
+    payload = None
+
+    def list(self, request, *args, **kwargs):
+        version = get_version(self.version_name)
+        renderer_format = request.accepted_renderer.format
+        etag = version_etag(
+            version, renderer_format, request.get_full_path())
+        last_modified = version_timestamp(version)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = self.get_list_response(
+                request, version, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def get_list_response(self, request, version, *args, **kwargs):
+        if request.query_params or request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        return self.payload.response(version, lambda: self.get_serializer(
+            self.get_queryset(), many=True).data)
+
+
+class ListDataMixin:
+
+    def list(self, request, *args, **kwargs):
+        return Response(self.get_list_data())
+
+    def get_list_data(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return self.get_serializer(queryset, many=True).data
+        return self.get_paginated_response(
+            self.get_serializer(page, many=True).data).data
+
+    @classmethod
+    def list_data(cls, request):
+        view = cls(action='list', args=(), kwargs={}, format_kwarg=None)
+        view.request = Request(request)
+        view.request.user = request.user
+        return view.get_list_data()
+
+
+class AnonymousCacheMixin(ListDataMixin):
+    anonymous_cache = None
+
+    def list(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().list(request, *args, **kwargs)
+        data, state = self.anonymous_cache.get(request, self.get_list_data)
+        response = Response(data)
+        response['X-Cache'] = state
+        return response
@@ -0,0 +1,139 @@
+import logging
+import os
+import re
+import sys
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+IGNORED_FILES = {
+    os.path.abspath(__file__),
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'middleware.py'),
+}
+
+current_detector = ContextVar('current_nplusone_detector', default=None)
+
+SQL_LITERALS = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+)
+
+
+class NPlusOneError(AssertionError):
+    pass
+
+
+def normalize_sql(sql):
+    for pattern, replacement in SQL_LITERALS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def _is_project_file(filename):
+    filename = os.path.abspath(filename)
+    return (
+        filename.startswith(settings.BASE_DIR)
+        and 'site-packages' not in filename
+        and filename not in IGNORED_FILES
+    )
+
+
+def _serializer_field(frame):
+    while frame is not None:
+        field = frame.f_locals.get('field')
+        serializer = frame.f_locals.get('self')
+        if (frame.f_code.co_name == 'to_representation'
+                and hasattr(field, 'field_name')
+                and serializer is not None):
+            return f'{type(serializer).__name__}.{field.field_name}'
+        frame = frame.f_back
+    return None
+
+
+def _origin():
+    frame = sys._getframe(2)
+    return _serializer_field(frame), [
+        line for line in traceback.extract_stack(frame)
+        if _is_project_file(line.filename)
+    ]
+
+
+class QueryShapeDetector:
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.counts = Counter()
+        self.origins = {}
+
+    def record(self, sql):
+        shape = normalize_sql(sql)
+        self.counts[shape] += 1
+        if shape not in self.origins:
+            self.origins[shape] = _origin()
+
+    @property
+    def repeated(self):
+        return [
+            (shape, count, *self.origins[shape])
+            for shape, count in self.counts.most_common()
+            if count >= self.threshold
+        ]
+
+    def report(self, label):
+        lines = [f'Повторяющиеся SQL-запросы в {label}:']
+        for shape, count, field, stack in self.repeated:
+            lines.append(f'  {count} × {shape}')
+            if field:
+                lines.append(f'    поле сериализатора: {field}')
+            lines.extend(
+                f'    {line}' for line in
+                ''.join(traceback.format_list(stack)).splitlines())
+        return '\n'.join(lines)
+
+    def check(self, label, raise_error):
+        if not self.repeated:
+            return
+        if raise_error:
+            raise NPlusOneError(self.report(label))
+        logger.warning(self.report(label))
+
+
+def _record_query(execute, sql, params, many, context):
+    detector = current_detector.get()
+    if detector is not None:
+        detector.record(sql)
+    return execute(sql, params, many, context)
+
+
+def _install_detector(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def install_detector():
+    connection_created.connect(_install_detector, dispatch_uid=__name__)
+    for connection in connections.all():
+        _install_detector(connection)
+
+
+@contextmanager
+def detect_nplusone(label='блоке', threshold=None, raise_error=True):
+    install_detector()
+    detector = QueryShapeDetector(
+        threshold or settings.NPLUSONE_THRESHOLD)
+    token = current_detector.set(detector)
+    try:
+        yield detector
+    finally:
+        current_detector.reset(token)
+    detector.check(label, raise_error)
@@ -0,0 +1,157 @@
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+from collections import OrderedDict
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .consts import ADMIN_EXACT_COUNT_LIMIT
+
+
+class KeysetPagination(BasePagination):
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    position_field = 'pub_date'
+    invalid_cursor_message = 'Неверный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = remove_query_param(
+            request.build_absolute_uri(), 'page')
+        position, reverse = self.decode_cursor(request)
+        field = self.position_field
+        if reverse:
+            queryset = queryset.order_by(field, 'pk')
+        else:
+            queryset = queryset.order_by(f'-{field}', '-pk')
+        if position is not None:
+            value, pk = position
+            lookup = 'gt' if reverse else 'lt'
+            queryset = queryset.filter(
+                Q(**{f'{field}__{lookup}': value})
+                | Q(**{field: value, f'pk__{lookup}': pk})
+            )
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+        self.first = self._position(results[0]) if results else position
+        self.last = self._position(results[-1]) if results else position
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.base_url,
+            self.cursor_query_param,
+            self.encode_cursor(self.last, reverse=False))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return replace_query_param(
+            self.base_url,
+            self.cursor_query_param,
+            self.encode_cursor(self.first, reverse=True))
+
+    def _position(self, obj):
+        return getattr(obj, self.position_field), obj.pk
+
+    def encode_cursor(self, position, reverse):
+        value, pk = position
+        cursor = f'{int(reverse)}|{value.isoformat()}|{pk}'
+        return b64encode(cursor.encode()).decode()
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            reverse, value, pk = b64decode(
+                cursor.encode(), validate=True).decode().split('|')
+            value = parse_datetime(value)
+            pk = int(pk)
+        except (BinasciiError, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if value is None or reverse not in ('0', '1'):
+            raise NotFound(self.invalid_cursor_message)
+        return (value, pk), reverse == '1'
+
+
+class RecipePagination(PageNumberPagination):
+    mode_query_param = 'pagination'
+    ids_query_param = 'ids'
+    search_query_param = 'search'
+    keyset_class = KeysetPagination
+    search_cursor_message = (
+        'Курсорная пагинация недоступна при поиске, '
+        'результаты упорядочены по релевантности')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if (self.keyset_class.cursor_query_param in request.query_params
+                or request.query_params.get(self.mode_query_param)
+                == 'cursor'):
+            if request.query_params.get(self.search_query_param):
+                raise ValidationError(
+                    {self.mode_query_param: [self.search_cursor_message]})
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        if self.is_unpaginated(request.query_params):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+    @classmethod
+    def is_unpaginated(cls, query_params):
+        return (bool(query_params.get(cls.ids_query_param))
+                and cls.page_query_param not in query_params)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class ApproximateCountPaginator(Paginator):
+    exact_count_limit = ADMIN_EXACT_COUNT_LIMIT
+
+    @cached_property
+    def count(self):
+        estimate = self.estimate_count()
+        if estimate is not None and estimate > self.exact_count_limit:
+            return estimate
+        return super().count
+
+    def estimate_count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql' or queryset.query.where:
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE relname = %s',
+                (queryset.model._meta.db_table,)
+            )
+            row = cursor.fetchone()
+        return int(row[0]) if row else None
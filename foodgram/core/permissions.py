@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import permissions
 
 
@@ -15,3 +16,13 @@ class OwnerOrReadOnly(permissions.BasePermission):
             permissions.SAFE_METHODS
             or obj.author == request.user
         )
+
+
+class InternalHost(permissions.BasePermission):
+
+    def has_permission(self, request, view):
+        address = (
+            request.META.get('HTTP_X_REAL_IP')
+            or request.META.get('REMOTE_ADDR')
+        )
+        return address in settings.METRICS_ALLOWED_IPS
@@ -0,0 +1,55 @@
+from hashlib import md5
+from time import time_ns
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import quote_etag
+
+VERSION_KEY_PREFIX = 'version'
+
+
+def _version_key(name):
+    return f'{VERSION_KEY_PREFIX}:{name}'
+
+
+def get_version(name):
+    key = _version_key(name)
+    cache.add(key, str(time_ns()), None)
+    return cache.get(key)
+
+
+async def aget_version(name):
+    key = _version_key(name)
+    await cache.aadd(key, str(time_ns()), None)
+    return await cache.aget(key)
+
+
+async def aget_versions(names):
+    versions = await cache.aget_many([_version_key(name) for name in names])
+    return {
+        name: versions.get(_version_key(name)) or await aget_version(name)
+        for name in names
+    }
+
+
+def get_versions(names):
+    versions = cache.get_many([_version_key(name) for name in names])
+    return {
+        name: versions.get(_version_key(name)) or get_version(name)
+        for name in names
+    }
+
+
+def bump_version(name):
+    transaction.on_commit(
+        lambda: cache.set(_version_key(name), str(time_ns()), None))
+
+
+def version_timestamp(version):
+    return int(version) // 10 ** 9
+
+
+def version_etag(version, renderer_format, path):
+    return quote_etag(md5(
+        f'{version}:{renderer_format}:{path}'.encode()
+    ).hexdigest())
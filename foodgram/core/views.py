@@ -0,0 +1,15 @@
+from django.http import HttpResponse
+from rest_framework.permissions import IsAdminUser
+from rest_framework.views import APIView
+
+from .metrics import registry
+from .permissions import InternalHost
+
+
+class MetricsAPIView(APIView):
+    permission_classes = [IsAdminUser | InternalHost]
+
+    def get(self, request):
+        return HttpResponse(
+            registry.collect(),
+            content_type='text/plain; version=0.0.4; charset=utf-8')
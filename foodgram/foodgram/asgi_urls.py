@@ -0,0 +1,8 @@
+from django.urls import path, include
+
+from .urls import urlpatterns as wsgi_urlpatterns
+
+urlpatterns = [
+    path('api/', include('recipes.async_urls')),
+    *wsgi_urlpatterns
+]
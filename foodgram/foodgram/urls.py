@@ -1,9 +1,12 @@
 from django.contrib import admin
 from django.urls import path, include
+
+from core.views import MetricsAPIView
 from recipes.views import SubViewSet
 
 urlpatterns = [
     path('api/users/subscriptions/', SubViewSet.as_view({'get': 'list'})),
+    path('api/metrics/', MetricsAPIView.as_view()),
     path('admin/', admin.site.urls),
     path('api/', include('users.urls')),
     path('api/', include('recipes.urls'))
@@ -1,14 +1,83 @@
 from django.contrib import admin
 
-from .models import Tag, Ingredient, Recipe, Favorite, IngredientAmount
+from core.pagination import ApproximateCountPaginator
+from .models import (Tag,
+                     Ingredient,
+                     Recipe,
+                     Favorite,
+                     ShoppingCart,
+                     IngredientAmount)
 
-admin.site.register(Tag)
-admin.site.register(Ingredient)
-admin.site.register(Favorite)
 
-admin.site.register(IngredientAmount)
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    list_display = ('name', 'color', 'slug')
+    search_fields = ('name', 'slug')
+
+
+@admin.register(Ingredient)
+class IngredientAdmin(admin.ModelAdmin):
+    list_display = ('name', 'measurement_unit')
+    search_fields = ('^name',)
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+
+
+class IngredientAmountInline(admin.TabularInline):
+    model = IngredientAmount
+    autocomplete_fields = ('ingredient',)
+    extra = 0
+    min_num = 1
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'recipe__author', 'ingredient')
 
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    pass
+    list_display = (
+        'name',
+        'author',
+        'pub_date',
+        'favorites_count',
+        'shopping_cart_count'
+    )
+    list_select_related = ('author',)
+    list_filter = ('tags',)
+    search_fields = ('name',)
+    autocomplete_fields = ('author',)
+    filter_horizontal = ('tags',)
+    readonly_fields = ('favorites_count', 'shopping_cart_count')
+    inlines = (IngredientAmountInline,)
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        if request.path.endswith('autocomplete/'):
+            return super().get_search_results(
+                request, queryset, search_term)
+        return queryset.search(search_term), False
+
+
+@admin.register(IngredientAmount)
+class IngredientAmountAdmin(admin.ModelAdmin):
+    list_display = ('recipe', 'ingredient', 'amount')
+    list_select_related = ('recipe__author', 'ingredient')
+    autocomplete_fields = ('recipe', 'ingredient')
+    search_fields = ('^ingredient__name',)
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+
+
+class UserRecipeAdmin(admin.ModelAdmin):
+    list_display = ('recipe', 'user')
+    list_select_related = ('recipe__author', 'user')
+    autocomplete_fields = ('recipe', 'user')
+    search_fields = ('^user__username', '^user__email')
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+
+
+admin.site.register(Favorite, UserRecipeAdmin)
+admin.site.register(ShoppingCart, UserRecipeAdmin)
@@ -0,0 +1,15 @@
+from django.urls import path
+
+from .async_views import (tag_list,
+                          ingredient_list,
+                          recipe_list,
+                          recipe_detail,
+                          download_shopping_cart)
+
+urlpatterns = [
+    path('tags/', tag_list),
+    path('ingredients/', ingredient_list),
+    path('recipes/', recipe_list),
+    path('recipes/download_shopping_cart/', download_shopping_cart),
+    path('recipes/<int:pk>/', recipe_detail),
+]
@@ -0,0 +1,189 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.exceptions import (APIException,
+                                       NotAuthenticated,
+                                       NotFound)
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+
+from core.authentication import CachedTokenAuthentication
+from core.consts import (FAVORITES,
+                         FOLLOWING,
+                         INGREDIENTS_VERSION,
+                         SHOPPING_CART,
+                         TAGS_VERSION)
+from core.membership import aget_member_ids
+from core.versions import aget_version, version_etag, version_timestamp
+from .ingredient_index import ingredient_index
+from .models import Ingredient, Recipe, Tag
+from .serializers import (IngredientSerializer,
+                          RecipeSerializer,
+                          TagSerializer)
+from .views import (DownloadShoppingCartAPIView,
+                    IngredientViewSet,
+                    RecipeViewSet,
+                    TagViewSet,
+                    shopping_cart_totals)
+
+authentication = CachedTokenAuthentication()
+renderer = JSONRenderer()
+
+
+def render(data, status=200):
+    return HttpResponse(
+        renderer.render(data),
+        content_type=renderer.media_type,
+        status=status)
+
+
+def error_response(exc):
+    data = exc.detail
+    if not isinstance(data, (list, dict)):
+        data = {'detail': data}
+    response = render(data, exc.status_code)
+    if exc.status_code == 401:
+        response['WWW-Authenticate'] = (
+            authentication.authenticate_header(None))
+    return response
+
+
+def async_read_view(sync_view):
+    sync_view = sync_to_async(sync_view)
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if (request.method != 'GET'
+                    or api_settings.URL_FORMAT_OVERRIDE in request.GET
+                    or 'text/html' in request.headers.get('Accept', '')):
+                return await sync_view(request, *args, **kwargs)
+            try:
+                user = await authentication.aauthenticate(request)
+                request.user = user[0] if user else AnonymousUser()
+                response = await view(request, *args, **kwargs)
+            except APIException as exc:
+                return error_response(exc)
+            if response is None:
+                return await sync_view(request, *args, **kwargs)
+            return response
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+async def versioned_response(request, version_name, get_response):
+    version = await aget_version(version_name)
+    etag = version_etag(version, 'json', request.get_full_path())
+    last_modified = version_timestamp(version)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = await get_response(version)
+        if response.status_code != 200:
+            return response
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+async def load_membership(request):
+    for kind in (FAVORITES, SHOPPING_CART, FOLLOWING):
+        await aget_member_ids(request, kind)
+
+
+def serialize(serializer_class, instance, request, **kwargs):
+    return serializer_class(
+        instance, context={'request': request}, **kwargs).data
+
+
+@async_read_view(TagViewSet.as_view({'get': 'list'}))
+async def tag_list(request):
+    async def get_tags():
+        return serialize(
+            TagSerializer, [tag async for tag in Tag.objects.all()],
+            request, many=True)
+
+    async def get_response(version):
+        if request.GET:
+            return render(await get_tags())
+        return await TagViewSet.payload.aresponse(version, get_tags)
+    return await versioned_response(request, TAGS_VERSION, get_response)
+
+
+@async_read_view(IngredientViewSet.as_view({'get': 'list'}))
+async def ingredient_list(request):
+    async def get_ingredients():
+        return serialize(
+            IngredientSerializer,
+            [ingredient async for ingredient in Ingredient.objects.all()],
+            request, many=True)
+
+    async def get_response(version):
+        name = request.GET.get('name')
+        if name is None:
+            return await IngredientViewSet.payload.aresponse(
+                version, get_ingredients)
+        limit = request.GET.get('limit')
+        if limit is not None:
+            if not limit.isdigit():
+                return HttpResponse(status=400)
+            limit = int(limit)
+        return render(await ingredient_index.asearch(name, limit))
+    return await versioned_response(
+        request, INGREDIENTS_VERSION, get_response)
+
+
+async def recipe_page(request):
+    await load_membership(request)
+    return await sync_to_async(RecipeViewSet.list_data)(request)
+
+
+@async_read_view(RecipeViewSet.as_view({'get': 'list', 'post': 'create'}))
+async def recipe_list(request):
+    if request.user.is_authenticated:
+        return render(await recipe_page(request))
+    data, state = await RecipeViewSet.anonymous_cache.aget(
+        request, lambda: recipe_page(request))
+    response = render(data)
+    response['X-Cache'] = state
+    return response
+
+
+@async_read_view(RecipeViewSet.as_view({
+    'get': 'retrieve',
+    'put': 'update',
+    'patch': 'partial_update',
+    'delete': 'destroy'
+}))
+async def recipe_detail(request, pk):
+    recipe = await Recipe.objects.with_related().filter(pk=pk).afirst()
+    if recipe is None:
+        raise NotFound()
+    await load_membership(request)
+    return render(await sync_to_async(serialize, thread_sensitive=False)(
+        RecipeSerializer, recipe, request))
+
+
+async def iterate(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+@async_read_view(DownloadShoppingCartAPIView.as_view())
+async def download_shopping_cart(request):
+    if not request.user.is_authenticated:
+        raise NotAuthenticated()
+    file_type = request.GET.get('type', 'txt')
+    if file_type not in DownloadShoppingCartAPIView.content_types:
+        return HttpResponse(status=400)
+    ingredients = [
+        item async for item in shopping_cart_totals(request.user)]
+    return DownloadShoppingCartAPIView.get_file_response(
+        file_type,
+        iterate(DownloadShoppingCartAPIView.get_content(
+            file_type, ingredients)))
@@ -0,0 +1,351 @@
+from base64 import b64encode
+from contextlib import nullcontext
+from io import BytesIO
+from math import ceil
+from statistics import mean
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from users.models import Subscribe
+from .images import take_upload
+from .models import Favorite, Recipe, ShoppingCart
+
+User = get_user_model()
+
+PLACEHOLDER_IMAGE = 'recipes/media/images/benchmark-placeholder.png'
+BULK_SIZE = 20
+
+
+def png(width=32, height=32):
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), (200, 120, 60)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[max(ceil(len(values) * percent / 100) - 1, 0)]
+
+
+class BenchmarkContext:
+
+    def __init__(self, email=None, password=None, prefix='load'):
+        dataset = User.objects.filter(username__startswith=f'{prefix}-')
+        users = dataset.filter(is_active=True, is_staff=False)
+        if email:
+            self.user = users.get(email=email)
+        else:
+            self.user = users.annotate(
+                favorites=Count('favorite')
+            ).order_by('-favorites').first()
+        recipes = Recipe.objects.filter(
+            author__username__startswith=f'{prefix}-')
+        self.recipe = recipes.exclude(author=self.user).order_by(
+            '-favorites_count').first()
+        if self.user is None or self.recipe is None:
+            raise User.DoesNotExist
+        self.password = password
+        self.other = dataset.exclude(pk=self.user.pk).filter(
+            recipes__isnull=False).order_by('-followers_count').first()
+        self.own_recipe = recipes.filter(author=self.user).first()
+        if self.own_recipe is None:
+            self.own_recipe = self.copy_recipe(self.recipe)
+        self.bulk_ids = list(recipes.exclude(
+            author=self.user
+        ).order_by('-favorites_count').values_list(
+            'pk', flat=True)[:BULK_SIZE])
+        self.tag = self.recipe.tags.first()
+        self.ingredient = self.recipe.ingredients.first()
+        self.second_user = users.exclude(pk=self.user.pk).first()
+        self.staff = dataset.filter(is_active=True, is_staff=True).first()
+        self.headers = self.auth_headers(self.user)
+        self.staff_headers = (
+            self.auth_headers(self.staff) if self.staff else None)
+        self.created = 0
+
+    @staticmethod
+    def auth_headers(user):
+        token, _ = Token.objects.get_or_create(user=user)
+        return {'Authorization': f'Token {token.key}'}
+
+    def copy_recipe(self, source):
+        storage = Recipe._meta.get_field('image').storage
+        if not storage.exists(PLACEHOLDER_IMAGE):
+            storage.save(PLACEHOLDER_IMAGE, ContentFile(png()))
+        recipe = Recipe.objects.create(
+            author=self.user,
+            name=source.name,
+            text=source.text,
+            cooking_time=source.cooking_time,
+            image=PLACEHOLDER_IMAGE)
+        recipe.tags.set(source.tags.all())
+        for amount in source.full_ingredient.all():
+            recipe.full_ingredient.create(
+                ingredient_id=amount.ingredient_id, amount=amount.amount)
+        return recipe
+
+    def recipe_data(self, **extra):
+        return {
+            'name': self.own_recipe.name,
+            'text': self.own_recipe.text,
+            'cooking_time': self.own_recipe.cooking_time,
+            'tags': list(
+                self.own_recipe.tags.values_list('id', flat=True)),
+            'ingredients': [
+                {'id': ingredient_id, 'amount': amount}
+                for ingredient_id, amount in
+                self.own_recipe.full_ingredient.values_list(
+                    'ingredient_id', 'amount')
+            ],
+            **extra
+        }
+
+
+class Case:
+
+    def __init__(self, name, method, path, status=200, data=None,
+                 headers='user', content_type='application/json',
+                 prepare=None, cleanup=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.status = status
+        self.data = data
+        self.headers = headers
+        self.content_type = content_type
+        self.prepare = prepare
+        self.cleanup = cleanup
+
+    def request(self, client, context, count_queries=False):
+        params = self.prepare(context) if self.prepare else {}
+        path = self.path.format(context=context, **params)
+        data = self.data(context) if callable(self.data) else self.data
+        kwargs = {'headers': self.get_headers(context)}
+        if data is not None:
+            kwargs['data'] = data
+            if self.content_type:
+                kwargs['content_type'] = self.content_type
+        capture = (CaptureQueriesContext(connection) if count_queries
+                   else nullcontext())
+        started = perf_counter()
+        with capture as queries:
+            response = getattr(client, self.method)(path, **kwargs)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        elapsed = perf_counter() - started
+        if self.cleanup:
+            self.cleanup(context, response)
+        return response, elapsed, len(queries) if count_queries else None
+
+    def get_headers(self, context):
+        if self.headers == 'user':
+            return context.headers
+        if self.headers == 'staff':
+            return context.staff_headers
+        if callable(self.headers):
+            return self.headers(context)
+        return {}
+
+    def available(self, context):
+        return self.headers != 'staff' or context.staff is not None
+
+    def run(self, context, requests, warmup):
+        client = Client()
+        for _ in range(warmup):
+            self.request(client, context)
+        _, _, query_count = self.request(client, context, True)
+        latencies = []
+        errors = 0
+        started = perf_counter()
+        for _ in range(requests):
+            response, elapsed, _ = self.request(client, context)
+            latencies.append(elapsed)
+            errors += response.status_code != self.status
+        total = perf_counter() - started
+        return {
+            'name': self.name,
+            'method': self.method.upper(),
+            'path': self.path.split('?')[0],
+            'requests': requests,
+            'errors': errors,
+            'queries': query_count,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'mean_ms': mean(latencies) * 1000,
+            'rps': requests / total,
+        }
+
+
+def adder(model, field, attribute):
+    def add(context):
+        model.objects.get_or_create(
+            user=context.user, **{field: getattr(context, attribute)})
+        return {}
+    return add
+
+
+def remover(model, field, attribute):
+    def remove(context, *args):
+        model.objects.filter(
+            user=context.user, **{field: getattr(context, attribute)}
+        ).delete()
+        return {}
+    return remove
+
+
+def bulk_adder(model):
+    def add(context):
+        for pk in context.bulk_ids:
+            model.objects.get_or_create(user=context.user, recipe_id=pk)
+        return {}
+    return add
+
+
+def bulk_remover(model):
+    def remove(context, *args):
+        model.objects.filter(
+            user=context.user, recipe_id__in=context.bulk_ids).delete()
+        return {}
+    return remove
+
+
+def bulk_data(context):
+    return {'ids': context.bulk_ids}
+
+
+def delete_created_recipe(context, response):
+    if response.status_code == 201:
+        recipe = Recipe.objects.get(pk=response.json()['id'])
+        recipe.image.delete(save=False)
+        recipe.delete()
+
+
+def create_disposable_recipe(context):
+    return {'recipe': context.copy_recipe(context.own_recipe).pk}
+
+
+def delete_upload(context, response):
+    if response.status_code == 201:
+        take_upload(response.json()['image_token'], context.user)
+
+
+def new_user_data(context):
+    context.created += 1
+    index = context.created
+    return {
+        'email': f'benchmark-{index}@example.com',
+        'username': f'benchmark-{index}',
+        'first_name': 'Benchmark',
+        'last_name': 'User',
+        'password': 'benchmark-Password-1',
+    }
+
+
+def delete_created_user(context, response):
+    if response.status_code == 201:
+        User.objects.filter(pk=response.json()['id']).delete()
+
+
+def second_user_headers(context):
+    return context.auth_headers(context.second_user)
+
+
+def upload_data(context):
+    file = BytesIO(png())
+    file.name = 'benchmark.png'
+    return {'file': file}
+
+
+CASES = (
+    Case('tags', 'get', '/api/tags/', headers=None),
+    Case('tag', 'get', '/api/tags/{context.tag.pk}/',
+         headers=None),
+    Case('ingredients', 'get', '/api/ingredients/', headers=None),
+    Case('ingredients search', 'get',
+         '/api/ingredients/?name=%D0%BC&limit=20', headers=None),
+    Case('ingredient', 'get',
+         '/api/ingredients/{context.ingredient.pk}/',
+         headers=None),
+    Case('recipes anonymous', 'get', '/api/recipes/', headers=None),
+    Case('recipes', 'get', '/api/recipes/'),
+    Case('recipes page 10', 'get', '/api/recipes/?page=10'),
+    Case('recipes cursor', 'get', '/api/recipes/?pagination=cursor'),
+    Case('recipes by tags', 'get',
+         '/api/recipes/?tags=breakfast&tags=lunch&tags=dinner'),
+    Case('recipes favorited', 'get', '/api/recipes/?is_favorited=1'),
+    Case('recipes in cart', 'get', '/api/recipes/?is_in_shopping_cart=1'),
+    Case('recipes by author', 'get',
+         '/api/recipes/?author={context.other.pk}'),
+    Case('recipes search', 'get',
+         '/api/recipes/?search=%D1%81%D1%83%D0%BF'),
+    Case('recipes by ids', 'get', '/api/recipes/?ids={ids}',
+         prepare=lambda context: {
+             'ids': ','.join(map(str, context.bulk_ids))}),
+    Case('recipe', 'get', '/api/recipes/{context.recipe.pk}/'),
+    Case('recipe create', 'post', '/api/recipes/', status=201,
+         data=lambda context: context.recipe_data(
+             image='data:image/png;base64,' + b64encode(png()).decode()),
+         cleanup=delete_created_recipe),
+    Case('recipe update', 'patch', '/api/recipes/{context.own_recipe.pk}/',
+         data=lambda context: context.recipe_data()),
+    Case('recipe delete', 'delete', '/api/recipes/{recipe}/', status=204,
+         prepare=create_disposable_recipe),
+    Case('favorite add', 'post', '/api/recipes/{context.recipe.pk}/favorite/',
+         status=201, prepare=remover(Favorite, 'recipe', 'recipe'),
+         cleanup=remover(Favorite, 'recipe', 'recipe')),
+    Case('favorite remove', 'delete',
+         '/api/recipes/{context.recipe.pk}/favorite/',
+         status=204, prepare=adder(Favorite, 'recipe', 'recipe')),
+    Case('cart add', 'post', '/api/recipes/{context.recipe.pk}/shopping_cart/',
+         status=201, prepare=remover(ShoppingCart, 'recipe', 'recipe'),
+         cleanup=remover(ShoppingCart, 'recipe', 'recipe')),
+    Case('cart remove', 'delete',
+         '/api/recipes/{context.recipe.pk}/shopping_cart/',
+         status=204, prepare=adder(ShoppingCart, 'recipe', 'recipe')),
+    Case('favorite bulk add', 'post', '/api/recipes/favorite/',
+         data=bulk_data, prepare=bulk_remover(Favorite),
+         cleanup=bulk_remover(Favorite)),
+    Case('favorite bulk remove', 'delete', '/api/recipes/favorite/',
+         data=bulk_data, prepare=bulk_adder(Favorite)),
+    Case('cart bulk add', 'post', '/api/recipes/shopping_cart/',
+         data=bulk_data, prepare=bulk_remover(ShoppingCart),
+         cleanup=bulk_remover(ShoppingCart)),
+    Case('cart bulk remove', 'delete', '/api/recipes/shopping_cart/',
+         data=bulk_data, prepare=bulk_adder(ShoppingCart)),
+    Case('shopping list', 'get', '/api/recipes/download_shopping_cart/'),
+    Case('shopping list csv', 'get',
+         '/api/recipes/download_shopping_cart/?type=csv'),
+    Case('image upload', 'post', '/api/recipes/images/', status=201,
+         data=upload_data, content_type=None, cleanup=delete_upload),
+    Case('subscriptions', 'get', '/api/users/subscriptions/'),
+    Case('subscriptions limited', 'get',
+         '/api/users/subscriptions/?recipes_limit=3'),
+    Case('subscribe', 'post', '/api/users/{context.other.pk}/subscribe/',
+         status=201, prepare=remover(Subscribe, 'author', 'other'),
+         cleanup=remover(Subscribe, 'author', 'other')),
+    Case('unsubscribe', 'delete', '/api/users/{context.other.pk}/subscribe/',
+         status=204, prepare=adder(Subscribe, 'author', 'other')),
+    Case('users', 'get', '/api/users/'),
+    Case('user', 'get', '/api/users/{context.other.pk}/'),
+    Case('me', 'get', '/api/users/me/'),
+    Case('user create', 'post', '/api/users/', status=201, headers=None,
+         data=new_user_data, cleanup=delete_created_user),
+    Case('set password', 'post', '/api/users/set_password/', status=204,
+         data=lambda context: {
+             'current_password': context.password,
+             'new_password': context.password}),
+    Case('token login', 'post', '/api/auth/token/login/', headers=None,
+         data=lambda context: {
+             'email': context.user.email, 'password': context.password}),
+    Case('token logout', 'post', '/api/auth/token/logout/', status=204,
+         headers=second_user_headers),
+    Case('token stats', 'get', '/api/auth/token/stats/', headers='staff'),
+)
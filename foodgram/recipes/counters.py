@@ -0,0 +1,70 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+recount_pending = ContextVar('recount_pending', default=False)
+
+
+def change_counter(model, pk, field, delta):
+    return change_counters(model, (pk,), field, delta)
+
+
+def change_counters(model, pks, field, delta):
+    queryset = model.objects.filter(pk__in=pks)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def counted(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(
+                **{field: OuterRef('pk')}
+            ).order_by().values(field).annotate(
+                total=Count('pk')
+            ).values('total')
+        ),
+        0
+    )
+
+
+@contextmanager
+def recount_after(model, pks, field, related_model, related_field):
+    token = recount_pending.set(True)
+    try:
+        yield
+    finally:
+        recount_pending.reset(token)
+    recount(model, pks, field, related_model, related_field)
+
+
+def recount(model, pks, field, related_model, related_field):
+    return model.objects.filter(pk__in=pks).update(
+        **{field: counted(related_model, related_field)})
+
+
+def recount_on_commit(origin, model, pk, field, related_model,
+                      related_field):
+    recounts = getattr(origin, '_pending_recounts', None)
+    if recounts is None:
+        recounts = origin._pending_recounts = {}
+        transaction.on_commit(lambda: recount_pending_counters(recounts))
+    recounts.setdefault(
+        (model, field, related_model, related_field), set()).add(pk)
+
+
+def recount_pending_counters(recounts):
+    for (model, field, related_model, related_field), pks in (
+            recounts.items()):
+        recount(model, pks, field, related_model, related_field)
+
+
+def reconcile_counter(model, field, related_model, related_field):
+    expected = counted(related_model, related_field)
+    return model.objects.exclude(
+        **{field: expected}
+    ).update(**{field: expected})
@@ -0,0 +1,179 @@
+import posixpath
+from datetime import timedelta
+from io import BytesIO
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile, File
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, UnidentifiedImageError
+
+from core.consts import (IMAGE_UPLOAD_CLAIM_TIMEOUT,
+                         IMAGE_UPLOAD_TOKEN_TIMEOUT,
+                         IMAGE_VARIANT_FORMATS,
+                         IMAGE_VARIANT_QUALITY,
+                         IMAGE_VARIANT_WIDTHS)
+from .models import Recipe
+
+VARIANTS_DIR = 'variants'
+UPLOADS_DIR = 'recipes/media/uploads'
+UPLOAD_EXTENSIONS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'WEBP': 'webp',
+    'GIF': 'gif',
+}
+
+
+def variant_name(name, width, extension):
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(
+        directory, VARIANTS_DIR, f'{stem}_{width}w.{extension}')
+
+
+def variant_names(name):
+    return {
+        variant: {
+            width: variant_name(name, width, extension)
+            for width in IMAGE_VARIANT_WIDTHS
+        }
+        for variant, (_, extension) in IMAGE_VARIANT_FORMATS.items()
+    }
+
+
+def generate_variants(image):
+    storage = image.storage
+    with storage.open(image.name) as file:
+        original = Image.open(file)
+        original.load()
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA')
+    names = variant_names(image.name)
+    for variant, (image_format, _) in IMAGE_VARIANT_FORMATS.items():
+        source = original
+        if image_format == 'JPEG':
+            source = original.convert('RGB')
+        for width, name in names[variant].items():
+            resized = source
+            if source.width > width:
+                resized = source.resize(
+                    (width, round(source.height * width / source.width)),
+                    Image.Resampling.LANCZOS)
+            buffer = BytesIO()
+            resized.save(
+                buffer, image_format, quality=IMAGE_VARIANT_QUALITY)
+            if storage.exists(name):
+                storage.delete(name)
+            storage.save(name, ContentFile(buffer.getvalue()))
+    return names
+
+
+def build_variants(image):
+    if not image:
+        return False
+    try:
+        generate_variants(image)
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+def has_variants(image):
+    return bool(image) and all(
+        image.storage.exists(name)
+        for widths in variant_names(image.name).values()
+        for name in widths.values()
+    )
+
+
+def variant_urls(image):
+    return {
+        variant: {
+            str(width): image.storage.url(name)
+            for width, name in widths.items()
+        }
+        for variant, widths in variant_names(image.name).items()
+    }
+
+
+def delete_variants(name, storage):
+    for widths in variant_names(name).values():
+        for variant in widths.values():
+            storage.delete(variant)
+
+
+def _upload_key(token):
+    return f'image_upload:{token}'
+
+
+def _upload_storage():
+    return Recipe._meta.get_field('image').storage
+
+
+def store_upload(file, user):
+    try:
+        image = Image.open(file)
+        image_format = image.format
+        image.verify()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError,
+            SyntaxError):
+        return None
+    if image_format not in UPLOAD_EXTENSIONS:
+        return None
+    file.seek(0)
+    storage = _upload_storage()
+    token = uuid4().hex
+    name = storage.save(
+        posixpath.join(
+            UPLOADS_DIR, f'{token}.{UPLOAD_EXTENSIONS[image_format]}'),
+        file
+    )
+    cache.set(
+        _upload_key(token),
+        {'name': name, 'user_id': user.id},
+        IMAGE_UPLOAD_TOKEN_TIMEOUT
+    )
+    return token, storage.url(name)
+
+
+def take_upload(token, user):
+    key = _upload_key(token)
+    claim_key = f'{key}:claim'
+    upload = cache.get(key)
+    if (upload is None or upload['user_id'] != user.id
+            or not cache.add(claim_key, True, IMAGE_UPLOAD_CLAIM_TIMEOUT)):
+        return None
+    storage = _upload_storage()
+    try:
+        file = storage.open(upload['name'])
+    except OSError:
+        cache.delete(claim_key)
+        return None
+    transaction.on_commit(
+        lambda: release_upload(upload['name'], file, key, claim_key))
+    return File(file, name=posixpath.basename(upload['name']))
+
+
+def release_upload(name, file, *keys):
+    file.close()
+    _upload_storage().delete(name)
+    cache.delete_many(keys)
+
+
+def purge_uploads(now=None):
+    storage = _upload_storage()
+    expired = (now or timezone.now()) - timedelta(
+        seconds=IMAGE_UPLOAD_TOKEN_TIMEOUT)
+    try:
+        _, files = storage.listdir(UPLOADS_DIR)
+    except FileNotFoundError:
+        return 0
+    purged = 0
+    for filename in files:
+        name = posixpath.join(UPLOADS_DIR, filename)
+        if storage.get_modified_time(name) < expired:
+            storage.delete(name)
+            purged += 1
+    return purged
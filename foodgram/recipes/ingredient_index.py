@@ -0,0 +1,108 @@
+from array import array
+from bisect import bisect_left
+from threading import Lock
+
+from core.consts import INGREDIENTS_VERSION
+from core.versions import aget_version, get_version
+from .models import Ingredient
+
+
+class IngredientIndex:
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+        self._index = ([], [], array('I'), array('H'))
+
+    @staticmethod
+    def _queryset():
+        return Ingredient.objects.values('id', 'name', 'measurement_unit')
+
+    @staticmethod
+    def _build(rows):
+        rows = sorted(
+            rows, key=lambda row: (row['name'].casefold(), row['id']))
+        keys = [row['name'].casefold() for row in rows]
+        suffixes = sorted(
+            ((index, position)
+             for index, key in enumerate(keys)
+             for position in range(1, len(key))),
+            key=lambda suffix: keys[suffix[0]][suffix[1]:]
+        )
+        return (keys, rows,
+                array('I', [index for index, _ in suffixes]),
+                array('H', [position for _, position in suffixes]))
+
+    def _load(self):
+        version = get_version(INGREDIENTS_VERSION)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._index = self._build(self._queryset())
+                    self._version = version
+        return self._index
+
+    async def _aload(self):
+        version = await aget_version(INGREDIENTS_VERSION)
+        if version != self._version:
+            index = self._build([row async for row in self._queryset()])
+            with self._lock:
+                self._index = index
+                self._version = version
+        return self._index
+
+    def search(self, name, limit=None):
+        return self._search(*self._load(), name, limit)
+
+    async def asearch(self, name, limit=None):
+        return self._search(*await self._aload(), name, limit)
+
+    @staticmethod
+    def _prefix_range(keys, prefix):
+        start = bisect_left(keys, prefix)
+        end = start
+        while end < len(keys) and keys[end].startswith(prefix):
+            end += 1
+        return start, end
+
+    @staticmethod
+    def _suffix_bound(keys, suffix_rows, suffix_positions, prefix, after):
+        low, high = 0, len(suffix_rows)
+        while low < high:
+            middle = (low + high) // 2
+            position = suffix_positions[middle]
+            suffix = keys[suffix_rows[middle]][
+                position:position + len(prefix)]
+            if suffix < prefix or (after and suffix == prefix):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    @classmethod
+    def _contains(cls, keys, suffix_rows, suffix_positions, prefix):
+        start = cls._suffix_bound(
+            keys, suffix_rows, suffix_positions, prefix, False)
+        end = cls._suffix_bound(
+            keys, suffix_rows, suffix_positions, prefix, True)
+        if end - start > len(keys):
+            return (index for index, key in enumerate(keys)
+                    if prefix in key)
+        return iter(sorted(set(suffix_rows[start:end])))
+
+    @classmethod
+    def _search(cls, keys, rows, suffix_rows, suffix_positions, name,
+                limit):
+        prefix = name.casefold()
+        start, end = cls._prefix_range(keys, prefix)
+        result = rows[start:end]
+        for index in cls._contains(
+                keys, suffix_rows, suffix_positions, prefix):
+            if limit is not None and len(result) >= limit:
+                break
+            if not start <= index < end:
+                result.append(rows[index])
+        return result[:limit]
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,115 @@
+import json
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from recipes.benchmarks import CASES, BenchmarkContext
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscribe
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Измеряет p50/p99, пропускную способность и число SQL-запросов '
+            'для каждого маршрута API')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument(
+            '--prefix', default='load',
+            help='Префикс пользователей, созданных generate_dataset')
+        parser.add_argument(
+            '--user',
+            help='Email пользователя из набора данных, от имени которого '
+                 'идут запросы')
+        parser.add_argument(
+            '--password', default='dataset-password',
+            help='Пароль пользователя для входа и смены пароля')
+        parser.add_argument(
+            '--only', action='append', default=[],
+            help='Запустить только сценарии, содержащие эту строку')
+        parser.add_argument('--output', help='Записать результаты в JSON')
+        parser.add_argument(
+            '--baseline', help='Сравнить с результатами из JSON')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['warmup'] < 0:
+            raise CommandError(
+                '--requests должен быть больше нуля, --warmup не меньше нуля')
+        baseline = {}
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = {
+                    result['name']: result
+                    for result in json.load(file)['results']
+                }
+        try:
+            context = BenchmarkContext(
+                options['user'], options['password'], options['prefix'])
+        except User.DoesNotExist:
+            raise CommandError(
+                f'Нет пользователя с рецептами среди {options["prefix"]}-*, '
+                'сначала выполните generate_dataset')
+
+        cases = [
+            case for case in CASES
+            if case.available(context) and (
+                not options['only']
+                or any(part in case.name for part in options['only']))
+        ]
+        self.stdout.write(
+            f'{"name":<24} {"method":<7} {"p50 ms":>8} {"p99 ms":>8} '
+            f'{"rps":>8} {"queries":>8} {"errors":>7} {"p50 Δ":>8}')
+        results = []
+        with override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for case in cases:
+                result = case.run(
+                    context, options['requests'], options['warmup'])
+                results.append(result)
+                self.stdout.write(self.format_row(
+                    result, baseline.get(result['name'])))
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump({
+                    'meta': self.get_meta(options),
+                    'results': results,
+                }, file, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                f'Результаты записаны в {options["output"]}'))
+
+    @staticmethod
+    def format_row(result, baseline):
+        change = ''
+        if baseline:
+            change = (
+                f'{(result["p50_ms"] / baseline["p50_ms"] - 1) * 100:+.0f}%')
+        return (
+            f'{result["name"]:<24} {result["method"]:<7} '
+            f'{result["p50_ms"]:>8.2f} {result["p99_ms"]:>8.2f} '
+            f'{result["rps"]:>8.1f} {result["queries"]:>8} '
+            f'{result["errors"]:>7} {change:>8}')
+
+    @staticmethod
+    def get_meta(options):
+        return {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'cache': settings.CACHES['default']['BACKEND'],
+            'requests': options['requests'],
+            'warmup': options['warmup'],
+            'dataset': {
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'favorites': Favorite.objects.count(),
+                'shopping_cart': ShoppingCart.objects.count(),
+                'subscriptions': Subscribe.objects.count(),
+            },
+        }
@@ -0,0 +1,111 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic, sleep
+
+from asgiref.sync import ThreadSensitiveContext
+from django.core.management import BaseCommand, CommandError
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Recipe, ShoppingCart
+
+ENDPOINTS = (
+    '/api/tags/',
+    '/api/ingredients/',
+    '/api/ingredients/?name=а&limit=10',
+    '/api/recipes/',
+    '/api/recipes/{recipe}/',
+    '/api/recipes/download_shopping_cart/',
+)
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает пропускную способность WSGI и ASGI обработчиков'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Число синхронных WSGI-воркеров'
+        )
+        parser.add_argument(
+            '--db-latency',
+            type=float,
+            default=0,
+            help='Искусственная задержка каждого SQL-запроса, мс'
+        )
+
+    def handle(self, *args, **options):
+        if min(options['requests'],
+               options['concurrency'],
+               options['workers']) < 1:
+            raise CommandError(
+                '--requests, --concurrency и --workers должны быть '
+                'больше нуля')
+        cart = ShoppingCart.objects.select_related('user').first()
+        recipe = Recipe.objects.first()
+        if cart is None or recipe is None:
+            raise CommandError(
+                'Нужны рецепты и хотя бы один список покупок')
+        token, _ = Token.objects.get_or_create(user=cart.user)
+        headers = {'Authorization': f'Token {token.key}'}
+        if options['db_latency']:
+            self.add_db_latency(options['db_latency'] / 1000)
+
+        self.stdout.write(
+            f'{"endpoint":<45} {"wsgi rps":>10} {"asgi rps":>10} '
+            f'{"errors":>8}')
+        for endpoint in ENDPOINTS:
+            path = endpoint.format(recipe=recipe.pk)
+            wsgi_rps, wsgi_errors = self.run_wsgi(path, headers, **options)
+            asgi_rps, asgi_errors = asyncio.run(
+                self.run_asgi(path, headers, **options))
+            self.stdout.write(
+                f'{endpoint:<45} {wsgi_rps:>10.1f} {asgi_rps:>10.1f} '
+                f'{wsgi_errors + asgi_errors:>8}')
+
+    @staticmethod
+    def add_db_latency(latency):
+        def delay(execute, sql, params, many, context):
+            sleep(latency)
+            return execute(sql, params, many, context)
+
+        def add_wrapper(connection, **kwargs):
+            connection.execute_wrappers.append(delay)
+
+        connection_created.connect(add_wrapper, weak=False)
+
+    @staticmethod
+    def run_wsgi(path, headers, requests, concurrency, workers, **options):
+        def get(_):
+            response = Client().get(path, headers=headers)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            return response.status_code
+
+        started = monotonic()
+        with ThreadPoolExecutor(min(workers, concurrency)) as executor:
+            statuses = list(executor.map(get, range(requests)))
+        elapsed = monotonic() - started
+        return requests / elapsed, sum(status >= 400 for status in statuses)
+
+    @staticmethod
+    async def run_asgi(path, headers, requests, concurrency, **options):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def get():
+            async with semaphore, ThreadSensitiveContext():
+                response = await client.get(path, headers=headers)
+                if response.streaming:
+                    [chunk async for chunk in response.streaming_content]
+                return response.status_code
+
+        started = monotonic()
+        statuses = await asyncio.gather(*(get() for _ in range(requests)))
+        elapsed = monotonic() - started
+        return requests / elapsed, sum(status >= 400 for status in statuses)
@@ -0,0 +1,260 @@
+import random
+from io import BytesIO
+from itertools import accumulate, islice
+from time import monotonic
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import transaction
+from PIL import Image
+
+from core.consts import (INGREDIENTS_VERSION,
+                         MAX_COOK_AMOUNT_TIME,
+                         MIN_COOK_AMOUNT_TIME,
+                         RECIPES_VERSION,
+                         TAGS_VERSION)
+from core.versions import bump_version
+from recipes.images import build_variants
+from recipes.models import (Favorite,
+                            Ingredient,
+                            IngredientAmount,
+                            Recipe,
+                            ShoppingCart,
+                            Tag)
+from users.models import Subscribe
+
+User = get_user_model()
+RecipeTag = Recipe.tags.through
+
+DEFAULT_TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+    ('Десерт', '#F2C94C', 'dessert'),
+    ('Выпечка', '#B86B3A', 'baking'),
+    ('Салат', '#6FCF97', 'salad'),
+)
+WORDS = (
+    'суп', 'борщ', 'салат', 'пирог', 'каша', 'запеканка', 'омлет', 'рагу',
+    'плов', 'паста', 'курица', 'говядина', 'овощи', 'грибы', 'сыр',
+    'картофель', 'капуста', 'рис', 'ягоды', 'шоколад', 'тыква', 'рыба',
+)
+IMAGE_NAME = 'recipes/media/images/dataset.png'
+
+
+def zipf_cum_weights(count, exponent):
+    return list(accumulate(1 / rank ** exponent
+                           for rank in range(1, count + 1)))
+
+
+def skewed_count(rng, mean, limit):
+    if mean <= 0:
+        return 0
+    return min(int(rng.expovariate(1 / mean)), limit)
+
+
+def bulk_insert(model, objects, batch_size):
+    objects = iter(objects)
+    inserted = 0
+    while True:
+        batch = list(islice(objects, batch_size))
+        if not batch:
+            return inserted
+        model.objects.bulk_create(
+            batch, batch_size=batch_size, ignore_conflicts=True)
+        inserted += len(batch)
+
+
+class Command(BaseCommand):
+    help = ('Генерирует нагрузочный набор данных: пользователей, рецепты, '
+            'избранное, списки покупок и подписки')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument(
+            '--recipes', type=float, default=3,
+            help='Среднее число рецептов на пользователя')
+        parser.add_argument(
+            '--favorites', type=float, default=20,
+            help='Среднее число избранных рецептов на пользователя')
+        parser.add_argument(
+            '--cart', type=float, default=5,
+            help='Среднее число рецептов в списке покупок')
+        parser.add_argument(
+            '--subscriptions', type=float, default=10,
+            help='Среднее число подписок на пользователя')
+        parser.add_argument('--min-ingredients', type=int, default=3)
+        parser.add_argument('--max-ingredients', type=int, default=12)
+        parser.add_argument('--max-tags', type=int, default=3)
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Показатель распределения Ципфа для популярности')
+        parser.add_argument('--prefix', default='load')
+        parser.add_argument('--password', default='dataset-password')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['batch_size'] < 1:
+            raise CommandError(
+                '--users и --batch-size должны быть больше нуля')
+        if not (1 <= options['min_ingredients']
+                <= options['max_ingredients']):
+            raise CommandError(
+                'Нужно 1 <= --min-ingredients <= --max-ingredients')
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        if len(ingredient_ids) < options['max_ingredients']:
+            raise CommandError(
+                'Недостаточно ингредиентов, сначала выполните import_csv')
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}-').exists():
+            raise CommandError(
+                f'Пользователи с префиксом {prefix} уже существуют')
+
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        started = monotonic()
+        with transaction.atomic():
+            tag_ids = self.create_tags()
+            user_ids = self.create_users()
+            recipe_ids = self.create_recipes(user_ids)
+            self.create_recipe_rows(recipe_ids, tag_ids, ingredient_ids)
+            self.create_subscriptions(user_ids)
+            self.create_user_recipes(
+                Favorite, 'favorites', 'Избранное', user_ids, recipe_ids)
+            self.create_user_recipes(
+                ShoppingCart, 'cart', 'Списки покупок', user_ids, recipe_ids)
+            call_command('reconcile_counters', stdout=self.stdout)
+        for name in (TAGS_VERSION, INGREDIENTS_VERSION, RECIPES_VERSION):
+            bump_version(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Набор данных создан за {monotonic() - started:.1f} с'))
+
+    def report(self, name, count):
+        self.stdout.write(f'{name}: {count}')
+
+    def create_tags(self):
+        for name, color, slug in DEFAULT_TAGS:
+            Tag.objects.get_or_create(
+                slug=slug, defaults={'name': name, 'color': color})
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def create_users(self):
+        prefix = self.options['prefix']
+        password = make_password(self.options['password'])
+        count = bulk_insert(User, (
+            User(
+                username=f'{prefix}-{index}',
+                email=f'{prefix}-{index}@example.com',
+                first_name=self.rng.choice(('Анна', 'Иван', 'Мария', 'Олег')),
+                last_name=self.rng.choice(('Иванова', 'Петров', 'Смирнова')),
+                password=password
+            )
+            for index in range(self.options['users'])
+        ), self.options['batch_size'])
+        self.report('Пользователи', count)
+        return list(User.objects.filter(
+            username__startswith=f'{prefix}-').values_list('id', flat=True))
+
+    def create_recipes(self, user_ids):
+        buffer = BytesIO()
+        Image.new('RGB', (640, 480), (230, 160, 90)).save(buffer, 'PNG')
+        image = default_storage.save(IMAGE_NAME, ContentFile(
+            buffer.getvalue()))
+        mean = self.options['recipes']
+        count = bulk_insert(Recipe, (
+            Recipe(
+                author_id=user_id,
+                name=' '.join(self.rng.sample(WORDS, 2)).capitalize(),
+                text=' '.join(self.rng.choices(WORDS, k=40)),
+                cooking_time=self.rng.randint(
+                    MIN_COOK_AMOUNT_TIME, min(MAX_COOK_AMOUNT_TIME, 240)),
+                image=image
+            )
+            for user_id in user_ids
+            for _ in range(skewed_count(self.rng, mean, int(mean * 20)))
+        ), self.options['batch_size'])
+        self.report('Рецепты', count)
+        if build_variants(Recipe(image=image).image):
+            Recipe.objects.filter(image=image).update(
+                image_variants_ready=True)
+        return list(Recipe.objects.filter(
+            author__username__startswith=f'{self.options["prefix"]}-'
+        ).values_list('id', flat=True))
+
+    def create_recipe_rows(self, recipe_ids, tag_ids, ingredient_ids):
+        self.rng.shuffle(ingredient_ids)
+        ingredient_weights = zipf_cum_weights(
+            len(ingredient_ids), self.options['skew'])
+        tag_weights = zipf_cum_weights(len(tag_ids), self.options['skew'])
+        max_tags = min(self.options['max_tags'], len(tag_ids))
+
+        def tag_rows():
+            for recipe_id in recipe_ids:
+                for tag_id in set(self.rng.choices(
+                        tag_ids, cum_weights=tag_weights,
+                        k=self.rng.randint(1, max_tags))):
+                    yield RecipeTag(recipe_id=recipe_id, tag_id=tag_id)
+
+        def ingredient_rows():
+            for recipe_id in recipe_ids:
+                for ingredient_id in set(self.rng.choices(
+                        ingredient_ids, cum_weights=ingredient_weights,
+                        k=self.rng.randint(
+                            self.options['min_ingredients'],
+                            self.options['max_ingredients']))):
+                    yield IngredientAmount(
+                        recipe_id=recipe_id,
+                        ingredient_id=ingredient_id,
+                        amount=self.rng.randint(1, 500))
+
+        batch_size = self.options['batch_size']
+        self.report('Теги рецептов',
+                    bulk_insert(RecipeTag, tag_rows(), batch_size))
+        self.report('Ингредиенты рецептов',
+                    bulk_insert(IngredientAmount, ingredient_rows(),
+                                batch_size))
+
+    def create_subscriptions(self, user_ids):
+        authors = list(User.objects.filter(
+            username__startswith=f'{self.options["prefix"]}-',
+            recipes__isnull=False
+        ).values_list('id', flat=True).distinct())
+        if not authors:
+            return
+        self.rng.shuffle(authors)
+        weights = zipf_cum_weights(len(authors), self.options['skew'])
+        mean = self.options['subscriptions']
+
+        def rows():
+            for user_id in user_ids:
+                count = skewed_count(self.rng, mean, len(authors))
+                for author_id in set(self.rng.choices(
+                        authors, cum_weights=weights, k=count)):
+                    if author_id != user_id:
+                        yield Subscribe(user_id=user_id, author_id=author_id)
+
+        self.report('Подписки', bulk_insert(
+            Subscribe, rows(), self.options['batch_size']))
+
+    def create_user_recipes(self, model, option, name, user_ids,
+                            recipe_ids):
+        if not recipe_ids:
+            return
+        recipe_ids = recipe_ids[:]
+        self.rng.shuffle(recipe_ids)
+        weights = zipf_cum_weights(len(recipe_ids), self.options['skew'])
+        mean = self.options[option]
+
+        def rows():
+            for user_id in user_ids:
+                count = skewed_count(self.rng, mean, len(recipe_ids))
+                for recipe_id in set(self.rng.choices(
+                        recipe_ids, cum_weights=weights, k=count)):
+                    yield model(user_id=user_id, recipe_id=recipe_id)
+
+        self.report(name, bulk_insert(
+            model, rows(), self.options['batch_size']))
@@ -0,0 +1,59 @@
+from time import sleep
+
+from django.core.management import BaseCommand
+from django.db import close_old_connections
+
+from core.consts import IMAGE_VARIANTS_POLL_INTERVAL, RECIPES_VERSION
+from core.versions import bump_version
+from recipes.images import build_variants, has_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Создаёт варианты картинок для рецептов, у которых их ещё нет, '
+            'и отмечает такие рецепты готовыми')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retry', action='store_true',
+            help='Пересоздать варианты даже для уже готовых рецептов')
+        parser.add_argument(
+            '--watch', action='store_true',
+            help='Работать постоянно, проверяя новые картинки каждые '
+                 f'{IMAGE_VARIANTS_POLL_INTERVAL} с')
+
+    def handle(self, *args, **options):
+        self.failed = set()
+        if not options['watch']:
+            self.build(options['retry'])
+            return
+        retry = options['retry']
+        while True:
+            close_old_connections()
+            self.build(retry, verbose=False)
+            retry = False
+            sleep(IMAGE_VARIANTS_POLL_INTERVAL)
+
+    def build(self, retry, verbose=True):
+        recipes = Recipe.objects.exclude(image='')
+        if not retry:
+            recipes = recipes.filter(image_variants_ready=False)
+        ready = failed = 0
+        for name in recipes.order_by().values_list(
+                'image', flat=True).distinct():
+            if name in self.failed:
+                continue
+            image = Recipe(image=name).image
+            if retry or not has_variants(image):
+                if not build_variants(image):
+                    failed += 1
+                    self.failed.add(name)
+                    self.stderr.write(f'Не удалось обработать {name}')
+                    continue
+            ready += Recipe.objects.filter(image=name).update(
+                image_variants_ready=True)
+        if ready:
+            bump_version(RECIPES_VERSION)
+        if verbose or ready or failed:
+            self.stdout.write(self.style.SUCCESS(
+                f'Готово рецептов: {ready}, ошибок: {failed}'))
@@ -1,25 +1,145 @@
-from django.core.management import BaseCommand
+import csv
+import json
+from io import StringIO
+from itertools import islice
 from pathlib import Path
-from csv import DictReader
+from time import monotonic
 
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.consts import INGREDIENTS_VERSION
+from core.versions import bump_version
 from recipes.models import Ingredient
 
+DEFAULT_FILE = (
+    Path(__file__).parent.parent.parent.parent / 'data' / 'ingredients.csv')
+DEFAULT_BATCH_SIZE = 5000
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    for item in csv.DictReader(file):
+        yield item['name'], item['measurement_unit']
+
+
+def read_json(file):
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    for chunk in iter(lambda: file.read(JSON_CHUNK_SIZE), ''):
+        buffer += chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started and buffer[position:position + 1] == '[':
+                started = True
+                position += 1
+                continue
+            if buffer[position:position + 1] in ('', ']'):
+                break
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break
+            yield item['name'], item['measurement_unit']
+        buffer = buffer[position:]
+    if buffer.strip() not in ('', ']'):
+        raise CommandError('Некорректный JSON')
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
+def batches(rows, batch_size):
+    rows = iter(rows)
+    while True:
+        batch = list(dict.fromkeys(islice(rows, batch_size)))
+        if not batch:
+            return
+        yield batch
 
-def import_csv():
-    file = f'{Path(__file__).parent.parent.parent.parent}/data/ingredients.csv'
 
-    for item in DictReader(open(file, encoding='utf-8')):
-        data = Ingredient(
-            name=item['name'],
-            measurement_unit=item['measurement_unit']
+def bulk_insert(rows, batch_size):
+    for batch in batches(rows, batch_size):
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=name, measurement_unit=unit)
+             for name, unit in batch),
+            batch_size=batch_size,
+            ignore_conflicts=True
+        )
+        yield len(batch)
+
+
+def copy_insert(rows, batch_size):
+    table = Ingredient._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMPORARY TABLE import_ingredient '
+            '(name varchar(200), measurement_unit varchar(200)) '
+            'ON COMMIT DROP'
+        )
+        for batch in batches(rows, batch_size):
+            buffer = StringIO()
+            csv.writer(buffer).writerows(batch)
+            buffer.seek(0)
+            cursor.copy_expert(
+                'COPY import_ingredient (name, measurement_unit) '
+                'FROM STDIN WITH (FORMAT csv)',
+                buffer
+            )
+            yield len(batch)
+        cursor.execute(
+            f'INSERT INTO {table} (name, measurement_unit) '
+            'SELECT DISTINCT name, measurement_unit FROM import_ingredient '
+            'ON CONFLICT (name, measurement_unit) DO NOTHING'
         )
-        data.save()
-    print('завершена успешно.\n\n'
-          '================================================'
-          '\n')
 
 
 class Command(BaseCommand):
+    help = 'Загружает ингредиенты из CSV или JSON без дубликатов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=str(DEFAULT_FILE))
+        parser.add_argument('--format', choices=READERS.keys())
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Не использовать COPY даже на PostgreSQL'
+        )
 
     def handle(self, *args, **options):
-        import_csv()
+        path = Path(options['path'])
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+        use_copy = (connection.vendor == 'postgresql'
+                    and not options['no_copy'])
+        insert = copy_insert if use_copy else bulk_insert
+
+        started = monotonic()
+        before = Ingredient.objects.count()
+        processed = 0
+        with open(path, encoding='utf-8') as file, transaction.atomic():
+            rows = READERS[file_format](file)
+            for count in insert(rows, options['batch_size']):
+                processed += count
+                self.stdout.write(f'Обработано строк: {processed}')
+        created = Ingredient.objects.count() - before
+        bump_version(INGREDIENTS_VERSION)
+
+        elapsed = monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Импорт завершён: обработано {processed}, '
+            f'добавлено {created}, пропущено {processed - created} '
+            f'за {elapsed:.2f} с ({processed / max(elapsed, 1e-6):.0f} '
+            f'строк/с)'
+        ))
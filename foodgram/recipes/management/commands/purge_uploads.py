@@ -0,0 +1,12 @@
+from django.core.management import BaseCommand
+
+from recipes.images import purge_uploads
+
+
+class Command(BaseCommand):
+    help = ('Удаляет загруженные картинки, токены которых истекли '
+            'и которые так и не попали в рецепт')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено файлов: {purge_uploads()}'))
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.4 on 2026-10-18 18:01
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientAmount = apps.get_model('recipes', 'IngredientAmount')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(
+        keep_id=Min('id'), total=Count('id')
+    ).filter(total__gt=1)
+    for group in duplicates:
+        extra = Ingredient.objects.filter(
+            name=group['name'],
+            measurement_unit=group['measurement_unit']
+        ).exclude(id=group['keep_id'])
+        for extra_id in extra.values_list('id', flat=True):
+            used_recipes = IngredientAmount.objects.filter(
+                ingredient_id=group['keep_id']).values('recipe_id')
+            IngredientAmount.objects.filter(
+                ingredient_id=extra_id
+            ).exclude(
+                recipe_id__in=used_recipes
+            ).update(ingredient_id=group['keep_id'])
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_recipe_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='Not unique ingredient unit'),
+        ),
+    ]
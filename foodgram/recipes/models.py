@@ -1,7 +1,19 @@
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import (SearchQuery,
+                                            SearchRank,
+                                            SearchVectorField)
+from django.db import connections, models
 from django.core.validators import RegexValidator
 from django.contrib.auth import get_user_model
-from django.db.models import UniqueConstraint
+from django.db.models import (Case,
+                              F,
+                              IntegerField,
+                              Prefetch,
+                              UniqueConstraint,
+                              Value,
+                              When,
+                              Window)
+from django.db.models.functions import RowNumber, Upper
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 from core.consts import MAX_COOK_AMOUNT_TIME, MIN_COOK_AMOUNT_TIME
@@ -52,11 +64,82 @@ class Ingredient(models.Model):
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ['name']
+        constraints = (
+            UniqueConstraint(
+                fields=(
+                    'name',
+                    'measurement_unit',
+                ),
+                name='Not unique ingredient unit',
+            ),
+        )
+        indexes = (
+            models.Index(
+                OpClass(Upper('name'), name='text_pattern_ops'),
+                name='ingredient_name_upper_idx',
+            ),
+        )
 
     def __str__(self):
         return self.name
 
 
+def recipe_prefetches():
+    return (
+        'tags',
+        Prefetch(
+            'full_ingredient',
+            queryset=IngredientAmount.objects.select_related('ingredient')
+        )
+    )
+
+
+class RecipeQuerySet(models.QuerySet):
+
+    def with_related(self):
+        return self.defer('search_vector').select_related(
+            'author'
+        ).prefetch_related(*recipe_prefetches())
+
+    def limit_per_author(self, limit):
+        return self.annotate(
+            author_row_number=Window(
+                RowNumber(),
+                partition_by=F('author'),
+                order_by=(F('pub_date').desc(), F('id').desc())
+            )
+        ).filter(author_row_number__lte=limit)
+
+    def in_id_order(self, ids):
+        return self.filter(pk__in=ids).order_by(Case(
+            *(When(pk=pk, then=Value(position))
+              for position, pk in enumerate(ids)),
+            output_field=IntegerField()
+        ))
+
+    def search(self, value):
+        value = value.strip()
+        if not value:
+            return self
+        if connections[self.db].vendor == 'postgresql':
+            query = SearchQuery(
+                value, config='russian', search_type='websearch')
+            return self.filter(search_vector=query).annotate(
+                search_rank=SearchRank(F('search_vector'), query)
+            ).order_by('-search_rank', '-pub_date', '-id')
+        value = value.lower()
+        words = value.split()
+        ranked = []
+        for pk, name, text, pub_date in self.values_list(
+                'pk', 'name', 'text', 'pub_date'):
+            name, text = name.lower(), text.lower()
+            if all(word in name or word in text for word in words):
+                rank = 2 if value in name else int(value in text)
+                ranked.append((rank, pub_date, pk))
+        ranked.sort(reverse=True)
+        return self.in_id_order([pk for _, _, pk in ranked])
+
+
 class Recipe(models.Model):
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -108,11 +191,43 @@ class Recipe(models.Model):
         db_index=True,
         help_text='Укажите дату публикации',
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном'
+    )
+    shopping_cart_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В списках покупок'
+    )
+    image_variants_ready = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name='Варианты картинки готовы'
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор'
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-pub_date']
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx',
+            ),
+            GinIndex(
+                fields=('search_vector',),
+                name='recipe_search_vector_idx',
+            ),
+        )
 
     def __str__(self):
         return f'Название: {self.name}, автор: {self.author}'
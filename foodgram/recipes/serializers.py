@@ -1,17 +1,49 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from drf_extra_fields.fields import Base64ImageField
 
+from .images import take_upload, variant_urls
 from .models import (Tag,
                      Ingredient,
                      Recipe,
                      IngredientAmount)
-from core.consts import MAX_COOK_AMOUNT_TIME, MIN_COOK_AMOUNT_TIME
+from core.consts import (BULK_RECIPES_LIMIT,
+                         FAVORITES,
+                         FOLLOWING,
+                         MAX_COOK_AMOUNT_TIME,
+                         MIN_COOK_AMOUNT_TIME,
+                         RECIPES_VERSION,
+                         SHOPPING_CART)
+from core.membership import is_member
+from core.versions import bump_version
 
 
 User = get_user_model()
 
 
+class ImageVariantsField(serializers.Field):
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        if not recipe.image_variants_ready:
+            return {}
+        variants = variant_urls(recipe.image)
+        request = self.context.get('request')
+        if request is None:
+            return variants
+        return {
+            variant: {
+                width: request.build_absolute_uri(url)
+                for width, url in widths.items()
+            }
+            for variant, widths in variants.items()
+        }
+
+
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
         model = Tag
@@ -37,20 +69,15 @@ class FavoriteSerializer(serializers.ModelSerializer):
 
 
 class IngredientAmountSerializer(serializers.ModelSerializer):
-    id = serializers.ReadOnlyField()
-    name = serializers.ReadOnlyField()
-    measurement_unit = serializers.ReadOnlyField()
-    amount = serializers.SerializerMethodField()
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit')
 
     class Meta:
-        model = Ingredient
+        model = IngredientAmount
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
-    def get_amount(self, ingredient):
-        recipe = self.context.get('parent_model')
-        ingredient_amount = ingredient.full_ingredient.all().get(recipe=recipe)
-        return ingredient_amount.amount
-
 
 class AddIngredientSerializer(serializers.ModelSerializer):
     id = serializers.IntegerField(source='ingredient_id')
@@ -58,19 +85,14 @@ class AddIngredientSerializer(serializers.ModelSerializer):
         min_value=MIN_COOK_AMOUNT_TIME,
         max_value=MAX_COOK_AMOUNT_TIME
     )
-    name = serializers.SerializerMethodField()
-    measurement_unit = serializers.SerializerMethodField()
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit')
 
     class Meta:
         model = IngredientAmount
         fields = ('id', 'amount', 'name', 'measurement_unit')
 
-    def get_name(self, obj):
-        return obj.ingredient.name
-
-    def get_measurement_unit(self, obj):
-        return obj.ingredient.measurement_unit
-
 
 class AuthorSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
@@ -87,31 +109,54 @@ class AuthorSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        return (user.is_authenticated
-                and user.current_user.all().filter(author=obj).exists())
+        return is_member(self.context['request'], FOLLOWING, obj.id)
 
 
 def ingredient_amount_create(recipe, ingredients):
-    objs = []
-    for ingredient in ingredients:
-        objs.append(
-            IngredientAmount(
-                recipe=recipe,
-                ingredient=Ingredient.objects.all().get(
-                    id=ingredient['ingredient_id']),
-                amount=ingredient['amount']
-            )
+    IngredientAmount.objects.bulk_create(
+        IngredientAmount(
+            recipe=recipe,
+            ingredient_id=ingredient['ingredient_id'],
+            amount=ingredient['amount']
         )
-    IngredientAmount.objects.bulk_create(objs)
+        for ingredient in ingredients
+    )
+
+
+def ingredient_amount_update(recipe, ingredients):
+    existing = {
+        ingredient_amount.ingredient_id: ingredient_amount
+        for ingredient_amount in recipe.full_ingredient.all()
+    }
+    amounts = {
+        ingredient['ingredient_id']: ingredient['amount']
+        for ingredient in ingredients
+    }
+    removed = existing.keys() - amounts.keys()
+    if removed:
+        IngredientAmount.objects.filter(
+            recipe=recipe, ingredient_id__in=removed).delete()
+    changed = []
+    for ingredient_id, ingredient_amount in existing.items():
+        amount = amounts.get(ingredient_id)
+        if amount is not None and amount != ingredient_amount.amount:
+            ingredient_amount.amount = amount
+            changed.append(ingredient_amount)
+    if changed:
+        IngredientAmount.objects.bulk_update(changed, ('amount',))
+    ingredient_amount_create(recipe, [
+        ingredient for ingredient in ingredients
+        if ingredient['ingredient_id'] not in existing
+    ])
 
 
 class RecipeSerializer(serializers.ModelSerializer):
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True, write_only=True)
+    tags = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), write_only=True)
     ingredients = AddIngredientSerializer(many=True, source='full_ingredient')
-    image = Base64ImageField()
+    image = Base64ImageField(required=False)
+    image_token = serializers.CharField(write_only=True, required=False)
+    image_variants = ImageVariantsField()
     author = AuthorSerializer(read_only=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
@@ -125,9 +170,12 @@ class RecipeSerializer(serializers.ModelSerializer):
         fields = ('id',
                   'ingredients',
                   'image',
+                  'image_token',
+                  'image_variants',
                   'author',
                   'is_favorited',
                   'is_in_shopping_cart',
+                  'favorites_count',
                   'cooking_time',
                   'name',
                   'text',
@@ -137,16 +185,13 @@ class RecipeSerializer(serializers.ModelSerializer):
         if not ingredients:
             raise serializers.ValidationError(
                 'Поле ingredients не должно быть пустым')
-        unique = set()
-        for ingredient in ingredients:
-            id = ingredient['ingredient_id']
-            if not Ingredient.objects.filter(id=id).exists():
-                raise serializers.ValidationError(
-                    'Все ингредиенты должны существовать')
-            unique.add(id)
+        unique = {ingredient['ingredient_id'] for ingredient in ingredients}
         if len(unique) != len(ingredients):
             raise serializers.ValidationError(
                 'Не должно быть повторяющихся ингредиентов')
+        if Ingredient.objects.filter(id__in=unique).count() != len(unique):
+            raise serializers.ValidationError(
+                'Все ингредиенты должны существовать')
         return ingredients
 
     def validate_tags(self, tags):
@@ -156,6 +201,9 @@ class RecipeSerializer(serializers.ModelSerializer):
         if len(set(tags)) != len(tags):
             raise serializers.ValidationError(
                 'Не должно быть повторяющихся тэгов')
+        if Tag.objects.filter(id__in=tags).count() != len(tags):
+            raise serializers.ValidationError(
+                'Все тэги должны существовать')
         return tags
 
     def validate_image(self, image):
@@ -164,14 +212,35 @@ class RecipeSerializer(serializers.ModelSerializer):
                 'Поле image не должно быть пустым')
         return image
 
+    def validate(self, attrs):
+        if (self.instance is None and not attrs.get('image')
+                and 'image_token' not in attrs):
+            raise serializers.ValidationError(
+                {'image': 'Поле image не должно быть пустым'})
+        return attrs
+
+    def take_image(self, validated_data):
+        token = validated_data.pop('image_token', None)
+        if token is None:
+            return
+        image = take_upload(token, self.context['request'].user)
+        if image is None:
+            raise serializers.ValidationError(
+                {'image_token': 'Недействительный токен изображения'})
+        validated_data['image'] = image
+
+    @transaction.atomic
     def create(self, validated_data):
+        self.take_image(validated_data)
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('full_ingredient')
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags)
         ingredient_amount_create(recipe, ingredients)
+        bump_version(RECIPES_VERSION)
         return recipe
 
+    @transaction.atomic
     def update(self, recipe, validated_data):
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('full_ingredient', None)
@@ -179,31 +248,26 @@ class RecipeSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Должно быть поле tags')
         if not ingredients:
             raise serializers.ValidationError('Должно быть поле ingredients')
+        self.take_image(validated_data)
 
+        changed = []
         for key, value in validated_data.items():
             if hasattr(recipe, key):
                 setattr(recipe, key, value)
+                changed.append(key)
 
-        if tags:
-            recipe.tags.clear()
-            recipe.tags.set(tags)
-
-        if ingredients:
-            recipe.ingredients.clear()
-            ingredient_amount_create(recipe, ingredients)
+        recipe.tags.set(tags)
+        ingredient_amount_update(recipe, ingredients)
 
-        recipe.save()
+        recipe.save(update_fields=changed)
+        bump_version(RECIPES_VERSION)
         return recipe
 
     def get_is_favorited(self, obj):
-        user = self.context['request'].user
-        return (user.is_authenticated
-                and user.favorite.all().filter(recipe=obj).exists())
+        return is_member(self.context['request'], FAVORITES, obj.id)
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context['request'].user
-        return (user.is_authenticated
-                and user.cart.all().filter(recipe=obj).exists())
+        return is_member(self.context['request'], SHOPPING_CART, obj.id)
 
     def to_representation(self, instance):
         serialized = TagSerializer(instance.tags, many=True)
@@ -214,8 +278,10 @@ class RecipeSerializer(serializers.ModelSerializer):
 
 class RecipeListSerializer(serializers.ModelSerializer):
     tags = TagSerializer(many=True, read_only=True)
-    ingredients = IngredientAmountSerializer(many=True)
+    ingredients = IngredientAmountSerializer(
+        many=True, source='full_ingredient')
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
     author = AuthorSerializer()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
@@ -229,34 +295,39 @@ class RecipeListSerializer(serializers.ModelSerializer):
             'ingredients',
             'is_favorited',
             'is_in_shopping_cart',
+            'favorites_count',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time'
         )
 
-    def to_representation(self, instance):
-        self.context['parent_model'] = instance
-        return super().to_representation(instance)
-
     def get_is_favorited(self, obj):
-        user = self.context['request'].user
-        return (user.is_authenticated
-                and user.favorite.all().filter(recipe=obj).exists())
+        return is_member(self.context['request'], FAVORITES, obj.id)
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context['request'].user
-        return (user.is_authenticated
-                and user.cart.all().filter(recipe=obj).exists())
+        return is_member(self.context['request'], SHOPPING_CART, obj.id)
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_RECIPES_LIMIT
+    )
 
 
 class ShortReciperSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
         fields = (
             'id',
             'name',
             'image',
+            'image_variants',
             'cooking_time'
         )
 
@@ -279,52 +350,9 @@ class SubscribeUserSerializer(serializers.ModelSerializer):
             'recipes_count'
         )
 
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
-        if 'limit' in self.context:
-            if self.context['limit'] < len(data['recipes']):
-                data['recipes'] = data['recipes'][:self.context['limit']]
-        return data
-
-    def get_recipes_count(self, obj):
-        recipes_count = obj.recipes.count()
-        return min(self.context.get('limit', recipes_count), recipes_count)
-
-    def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        return (user.is_authenticated
-                and user.current_user.all().filter(author=obj).exists())
-
-
-class SubscribeUserSerializerPres(serializers.ModelSerializer):
-    recipes = ShortReciperSerializer(many=True, read_only=True)
-    recipes_count = serializers.SerializerMethodField()
-    is_subscribed = serializers.SerializerMethodField()
-
-    class Meta:
-        model = User
-        fields = (
-            'email',
-            'id',
-            'username',
-            'first_name',
-            'last_name',
-            'is_subscribed',
-            'recipes',
-            'recipes_count'
-        )
-
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
-        if 'limit' in self.context:
-            if self.context['limit'] < len(data['recipes']):
-                data['recipes'] = data['recipes'][:self.context['limit']]
-        return data
-
     def get_recipes_count(self, obj):
-        recipes_count = obj.recipes.count()
-        return min(self.context.get('limit', recipes_count), recipes_count)
+        return min(self.context.get('limit', obj.recipes_count),
+                   obj.recipes_count)
 
     def get_is_subscribed(self, obj):
-        user = User.objects.get(id=obj.id)
-        return user.is_authenticated
+        return is_member(self.context['request'], FOLLOWING, obj.id)
@@ -0,0 +1,170 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import (m2m_changed,
+                                      post_delete,
+                                      post_init,
+                                      post_save)
+from django.dispatch import receiver
+
+from core.consts import (FAVORITES,
+                         FOLLOWING,
+                         INGREDIENTS_VERSION,
+                         RECIPES_VERSION,
+                         SHOPPING_CART,
+                         TAGS_VERSION)
+from core.membership import invalidate_member_ids
+from core.versions import bump_version
+from users.models import Subscribe
+from .counters import change_counter, recount_on_commit, recount_pending
+from .images import delete_variants
+from .models import (Favorite,
+                     Ingredient,
+                     IngredientAmount,
+                     Recipe,
+                     ShoppingCart,
+                     Tag)
+
+User = get_user_model()
+
+AUTHOR_FIELDS = ('email', 'username', 'first_name', 'last_name')
+
+
+def is_cascade(sender, origin):
+    if isinstance(origin, QuerySet):
+        return origin.model is not sender
+    return origin is not None and not isinstance(origin, sender)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def bump_tags_version(**kwargs):
+    bump_version(TAGS_VERSION)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_ingredients_version(**kwargs):
+    bump_version(INGREDIENTS_VERSION)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=IngredientAmount)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_recipes_version(**kwargs):
+    bump_version(RECIPES_VERSION)
+
+
+def author_fields(user):
+    return tuple(user.__dict__.get(field) for field in AUTHOR_FIELDS)
+
+
+@receiver(post_init, sender=User)
+def remember_author_fields(instance, **kwargs):
+    instance._saved_author = author_fields(instance)
+
+
+@receiver(post_save, sender=User)
+def bump_recipes_version_on_author_change(instance, created, **kwargs):
+    saved = author_fields(instance)
+    if not created and saved != instance._saved_author:
+        bump_version(RECIPES_VERSION)
+    instance._saved_author = saved
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+def invalidate_favorites(sender, instance, origin=None, **kwargs):
+    if not is_cascade(sender, origin):
+        invalidate_member_ids(instance.user_id, FAVORITES)
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def invalidate_shopping_cart(sender, instance, origin=None, **kwargs):
+    if not is_cascade(sender, origin):
+        invalidate_member_ids(instance.user_id, SHOPPING_CART)
+
+
+@receiver((post_save, post_delete), sender=Subscribe)
+def invalidate_following(sender, instance, origin=None, **kwargs):
+    if not is_cascade(sender, origin):
+        invalidate_member_ids(instance.user_id, FOLLOWING)
+
+
+def delete_unused_variants(name, storage):
+    if not Recipe.objects.filter(image=name).exists():
+        delete_variants(name, storage)
+
+
+@receiver(post_init, sender=Recipe)
+def remember_image(instance, **kwargs):
+    image = instance.__dict__.get('image')
+    instance._saved_image = getattr(image, 'name', image)
+
+
+@receiver(post_save, sender=Recipe)
+def update_image_variants(instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    previous = None if created else instance._saved_image
+    image = instance.image
+    if not created and image.name == previous:
+        return
+    instance._saved_image = image.name
+    if instance.image_variants_ready:
+        Recipe.objects.filter(pk=instance.pk).update(
+            image_variants_ready=False)
+        instance.image_variants_ready = False
+    if previous:
+        transaction.on_commit(
+            lambda: delete_unused_variants(previous, image.storage))
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_image_variants(instance, **kwargs):
+    if instance.image:
+        delete_unused_variants(instance.image.name, instance.image.storage)
+
+
+def change_counter_on(model, related_field, field, created=True, **kwargs):
+    if not created or recount_pending.get():
+        return
+    pk = getattr(kwargs['instance'], f'{related_field}_id')
+    if kwargs['signal'] is post_save:
+        change_counter(model, pk, field, 1)
+        return
+    origin = kwargs.get('origin')
+    if not is_cascade(kwargs['sender'], origin):
+        change_counter(model, pk, field, -1)
+    elif not (isinstance(origin, model) and origin.pk == pk):
+        recount_on_commit(
+            origin, model, pk, field, kwargs['sender'], related_field)
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+def count_favorites(**kwargs):
+    change_counter_on(Recipe, 'recipe', 'favorites_count', **kwargs)
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+def bump_recipes_version_on_favorite(sender, origin=None, created=True,
+                                     **kwargs):
+    if not created or recount_pending.get():
+        return
+    if is_cascade(sender, origin):
+        if getattr(origin, '_recipes_version_bumped', False):
+            return
+        origin._recipes_version_bumped = True
+    bump_version(RECIPES_VERSION)
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def count_shopping_cart(**kwargs):
+    change_counter_on(Recipe, 'recipe', 'shopping_cart_count', **kwargs)
+
+
+@receiver((post_save, post_delete), sender=Subscribe)
+def count_followers(**kwargs):
+    change_counter_on(User, 'author', 'followers_count', **kwargs)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def count_recipes(**kwargs):
+    change_counter_on(User, 'author', 'recipes_count', **kwargs)
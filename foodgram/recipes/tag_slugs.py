@@ -0,0 +1,36 @@
+from threading import Lock
+
+from core.consts import TAGS_VERSION
+from core.versions import get_version
+from .models import Tag
+
+
+class TagSlugMap:
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+        self._ids = {}
+
+    def _load(self):
+        version = get_version(TAGS_VERSION)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._ids = dict(Tag.objects.values_list('slug', 'id'))
+                    self._version = version
+        return self._ids
+
+    def choices(self):
+        return [(slug, slug) for slug in self._load()]
+
+    def ids(self, slugs):
+        tag_ids = self._load()
+        return [tag_ids[slug] for slug in slugs if slug in tag_ids]
+
+
+tag_slug_map = TagSlugMap()
+
+
+def tag_slug_choices():
+    return tag_slug_map.choices()
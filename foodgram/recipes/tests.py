@@ -0,0 +1,819 @@
+import csv
+import json
+import os
+import shutil
+import sys
+import tempfile
+from base64 import b64encode
+from io import BytesIO, StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import (AsyncClient,
+                         RequestFactory,
+                         TestCase,
+                         override_settings)
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from users.models import Subscribe
+from core.consts import (BULK_ADDED,
+                         BULK_EXISTS,
+                         BULK_NOT_FOUND,
+                         BULK_REMOVED,
+                         FAVORITES)
+from core.membership import MEMBERSHIP_QUERIES
+from core.metrics import SERIES_COUNT, MetricsRegistry, registry
+from core.nplusone import NPlusOneError, detect_nplusone
+from foodgram.settings import BASE_DIR
+from .images import variant_names
+from .ingredient_index import IngredientIndex
+from .models import (Favorite,
+                     Ingredient,
+                     IngredientAmount,
+                     Recipe,
+                     ShoppingCart,
+                     Tag)
+from .serializers import RecipeListSerializer
+from .views import RecipeViewSet
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+RECIPES_URL = '/api/recipes/'
+SUBSCRIPTIONS_URL = '/api/users/subscriptions/'
+TAGS_URL = '/api/tags/'
+UPLOAD_URL = '/api/recipes/images/'
+INGREDIENTS_URL = '/api/ingredients/'
+INGREDIENTS_CSV = os.path.join(
+    os.path.dirname(BASE_DIR), 'data', 'ingredients.csv')
+DOWNLOAD_URL = '/api/recipes/download_shopping_cart/'
+METRICS_URL = '/api/metrics/'
+
+
+def png(color=(200, 120, 60)):
+    buffer = BytesIO()
+    Image.new('RGB', (32, 32), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def base64_png(color=(200, 120, 60)):
+    return f'data:image/png;base64,{b64encode(png(color)).decode()}'
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, NPLUSONE_DETECTION=True,
+                   NPLUSONE_RAISE=True)
+class RecipeAPITestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='author-Password-1', first_name='Анна',
+            last_name='Иванова')
+        cls.user = User.objects.create_user(
+            username='user', email='user@example.com',
+            password='user-Password-1', first_name='Иван',
+            last_name='Петров')
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {index}', color='#000000', slug=f'tag-{index}')
+            for index in range(3)
+        ]
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {index}', measurement_unit='г')
+            for index in range(40)
+        )
+        cls.image = default_storage.save(
+            'recipes/media/images/test.png', ContentFile(png()))
+        cls.token = Token.objects.create(user=cls.user)
+        cls.author_token = Token.objects.create(user=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        self.author_client = APIClient()
+        self.author_client.credentials(
+            HTTP_AUTHORIZATION=f'Token {self.author_token}')
+
+    def create_recipes(self, count=1, ingredients=1):
+        recipes = []
+        for _ in range(count):
+            recipe = Recipe.objects.create(
+                author=self.author, name='Рецепт', text='Описание',
+                cooking_time=10, image=self.image)
+            recipe.tags.set(self.tags)
+            IngredientAmount.objects.bulk_create(
+                IngredientAmount(
+                    recipe=recipe, ingredient=ingredient, amount=10)
+                for ingredient in self.ingredients[:ingredients]
+            )
+            recipes.append(recipe)
+        return recipes
+
+    def recipe_data(self, ingredients=1, amount=10, tags=3):
+        return {
+            'name': 'Рецепт',
+            'text': 'Описание',
+            'cooking_time': 10,
+            'tags': [tag.id for tag in self.tags[:tags]],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': amount}
+                for ingredient in self.ingredients[:ingredients]
+            ],
+        }
+
+    def assertQueries(self, count, client, method, url, data=None,
+                      status=200):
+        cache.clear()
+        with self.assertNumQueries(count):
+            response = getattr(client, method)(url, data, format='json')
+        self.assertEqual(response.status_code, status, response.content)
+        return response
+
+
+class RecipeQueriesTest(RecipeAPITestCase):
+
+    def test_anonymous_list_does_not_grow_with_recipes(self):
+        self.create_recipes()
+        self.assertQueries(4, self.anonymous, 'get', RECIPES_URL)
+        self.create_recipes(5)
+        response = self.assertQueries(4, self.anonymous, 'get', RECIPES_URL)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.anonymous.get(RECIPES_URL)
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_authenticated_list_does_not_grow_with_recipes(self):
+        self.create_recipes()
+        self.assertQueries(8, self.client, 'get', RECIPES_URL)
+        self.create_recipes(5)
+        self.assertQueries(8, self.client, 'get', RECIPES_URL)
+
+    def test_list_does_not_grow_with_ingredients(self):
+        self.create_recipes(ingredients=1)
+        self.assertQueries(4, self.anonymous, 'get', RECIPES_URL)
+        self.assertQueries(8, self.client, 'get', RECIPES_URL)
+        Recipe.objects.all().delete()
+        self.create_recipes(ingredients=40)
+        self.assertQueries(4, self.anonymous, 'get', RECIPES_URL)
+        response = self.assertQueries(8, self.client, 'get', RECIPES_URL)
+        self.assertEqual(
+            len(response.data['results'][0]['ingredients']), 40)
+
+    def test_retrieve_does_not_grow_with_ingredients(self):
+        small, = self.create_recipes(ingredients=1)
+        large, = self.create_recipes(ingredients=40)
+        self.assertQueries(7, self.client, 'get', f'{RECIPES_URL}{small.id}/')
+        response = self.assertQueries(
+            7, self.client, 'get', f'{RECIPES_URL}{large.id}/')
+        self.assertEqual(len(response.data['ingredients']), 40)
+
+    def test_create_does_not_grow_with_ingredients(self):
+        image = base64_png()
+        for ingredients, tags in ((1, 1), (40, 3)):
+            response = self.assertQueries(
+                16, self.author_client, 'post', RECIPES_URL,
+                {**self.recipe_data(ingredients, tags=tags), 'image': image},
+                status=201)
+            self.assertEqual(len(response.data['ingredients']), ingredients)
+            self.assertEqual(len(response.data['tags']), tags)
+        data = self.recipe_data()
+        data['tags'].append(max(tag.id for tag in self.tags) + 1)
+        response = self.assertQueries(
+            3, self.author_client, 'post', RECIPES_URL,
+            {**data, 'image': image}, status=400)
+        self.assertIn('tags', response.data)
+
+    def test_update_writes_only_changed_ingredients(self):
+        recipe, = self.create_recipes(ingredients=40)
+        url = f'{RECIPES_URL}{recipe.id}/'
+        self.assertQueries(
+            15, self.author_client, 'patch', url, self.recipe_data(40))
+        self.assertQueries(
+            16, self.author_client, 'patch', url,
+            self.recipe_data(40, amount=20))
+        self.assertQueries(
+            18, self.author_client, 'patch', url,
+            self.recipe_data(1, amount=30))
+        self.assertEqual(
+            list(recipe.full_ingredient.values_list(
+                'ingredient_id', 'amount')),
+            [(self.ingredients[0].id, 30)])
+        response = self.assertQueries(
+            17, self.author_client, 'patch', url, self.recipe_data(40))
+        self.assertEqual(len(response.data['ingredients']), 40)
+
+    def test_cursor_pages_do_not_grow_with_recipes(self):
+        recipes = self.create_recipes(14)
+        response = self.assertQueries(
+            7, self.client, 'get', RECIPES_URL, {'pagination': 'cursor'})
+        first_page = [recipe['id'] for recipe in response.data['results']]
+        self.assertEqual(
+            first_page, [recipe.id for recipe in recipes[:-7:-1]])
+        self.assertIsNone(response.data['previous'])
+        response = self.assertQueries(
+            7, self.client, 'get', response.data['next'])
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [recipe.id for recipe in recipes[-7:-13:-1]])
+        response = self.assertQueries(
+            7, self.client, 'get', response.data['previous'])
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            first_page)
+
+    def test_bulk_favorite_and_cart_do_not_grow_with_ids(self):
+        recipes = self.create_recipes(20)
+        ids = [recipe.id for recipe in recipes]
+        for model, url, counter in (
+                (Favorite, f'{RECIPES_URL}favorite/', 'favorites_count'),
+                (ShoppingCart, f'{RECIPES_URL}shopping_cart/',
+                 'shopping_cart_count')):
+            with self.subTest(url=url):
+                self.assertQueries(
+                    6, self.client, 'post', url, {'ids': ids[:1]})
+                self.assertQueries(6, self.client, 'post', url, {'ids': ids})
+                self.assertEqual(
+                    model.objects.filter(user=self.user).count(), 20)
+                self.assertEqual(
+                    set(Recipe.objects.values_list(counter, flat=True)),
+                    {1})
+                self.assertQueries(
+                    7, self.client, 'delete', url, {'ids': ids[:1]})
+                self.assertQueries(
+                    7, self.client, 'delete', url, {'ids': ids})
+                self.assertFalse(model.objects.filter(user=self.user))
+                self.assertEqual(
+                    set(Recipe.objects.values_list(counter, flat=True)),
+                    {0})
+
+    def test_delete_does_not_grow_with_relations(self):
+        for favorites in (1, 3):
+            recipe, = self.create_recipes()
+            fans = [
+                User.objects.create_user(
+                    username=f'fan{recipe.id}-{index}',
+                    email=f'fan{recipe.id}-{index}@example.com',
+                    password='fan-Password-1')
+                for index in range(favorites)
+            ]
+            for fan in fans:
+                Favorite.objects.create(user=fan, recipe=recipe)
+                ShoppingCart.objects.create(user=fan, recipe=recipe)
+            with self.subTest(favorites=favorites), \
+                    self.captureOnCommitCallbacks(execute=True):
+                self.assertQueries(
+                    13, self.author_client, 'delete',
+                    f'{RECIPES_URL}{recipe.id}/', status=204)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 0)
+
+    def test_user_delete_recounts_once(self):
+        recipes = self.create_recipes(3)
+        for relations in (1, 3):
+            user = User.objects.create_user(
+                username=f'gone{relations}',
+                email=f'gone{relations}@example.com',
+                password='gone-Password-1')
+            Subscribe.objects.create(user=user, author=self.author)
+            for recipe in recipes[:relations]:
+                Favorite.objects.create(user=user, recipe=recipe)
+                ShoppingCart.objects.create(user=user, recipe=recipe)
+            with self.subTest(relations=relations), \
+                    self.assertNumQueries(16), \
+                    self.captureOnCommitCallbacks(execute=True):
+                user.delete()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 0)
+        self.assertEqual(
+            set(Recipe.objects.values_list(
+                'favorites_count', 'shopping_cart_count')),
+            {(0, 0)})
+
+    def test_ids_keep_requested_order(self):
+        recipes = self.create_recipes(10)
+        ids = [recipe.id for recipe in recipes]
+        ids = ids[5:] + ids[:5]
+        response = self.assertQueries(
+            7, self.client, 'get', RECIPES_URL,
+            {'ids': ','.join(map(str, ids[:1]))})
+        self.assertEqual([recipe['id'] for recipe in response.data], ids[:1])
+        response = self.assertQueries(
+            7, self.client, 'get', RECIPES_URL,
+            {'ids': ','.join(map(str, ids))})
+        self.assertEqual([recipe['id'] for recipe in response.data], ids)
+
+    def test_subscriptions_do_not_grow_with_recipes(self):
+        Subscribe.objects.create(user=self.user, author=self.author)
+        self.create_recipes()
+        self.assertQueries(5, self.client, 'get', SUBSCRIPTIONS_URL)
+        self.create_recipes(5)
+        response = self.assertQueries(
+            5, self.client, 'get', SUBSCRIPTIONS_URL)
+        self.assertEqual(len(response.data['results'][0]['recipes']), 6)
+        response = self.assertQueries(
+            5, self.client, 'get', SUBSCRIPTIONS_URL, {'recipes_limit': 2})
+        self.assertEqual(len(response.data['results'][0]['recipes']), 2)
+        self.assertEqual(response.data['results'][0]['recipes_count'], 2)
+
+    def test_subscribe_does_not_grow_with_recipes(self):
+        self.create_recipes(6)
+        url = f'/api/users/{self.author.id}/subscribe/'
+        for recipes_limit in ('', '2'):
+            with self.subTest(recipes_limit=recipes_limit):
+                self.assertQueries(
+                    8, self.client, 'post',
+                    f'{url}?recipes_limit={recipes_limit}', status=201)
+                self.assertQueries(
+                    6, self.client, 'delete', url, status=204)
+
+
+class RecipeAPITest(RecipeAPITestCase):
+
+    def result_ids(self, response):
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_nplusone_reports_repeated_queries(self):
+        self.create_recipes(6)
+        request = RequestFactory().get(RECIPES_URL)
+        request.user = self.user
+        with self.assertRaisesMessage(
+                NPlusOneError, 'RecipeListSerializer.tags'):
+            with detect_nplusone('тесте'):
+                RecipeListSerializer(
+                    Recipe.objects.all(), many=True,
+                    context={'request': request}).data
+        with detect_nplusone('тесте') as detector:
+            RecipeListSerializer(
+                Recipe.objects.with_related(), many=True,
+                context={'request': request}).data
+        self.assertEqual(detector.repeated, [])
+
+    def test_nplusone_middleware_checks_api_requests(self):
+        self.create_recipes(6)
+        self.assertEqual(
+            self.client.get(RECIPES_URL).status_code, 200)
+        with mock.patch.object(
+                RecipeViewSet, 'get_queryset',
+                lambda view: Recipe.objects.all()):
+            with self.assertRaises(NPlusOneError):
+                self.client.get(RECIPES_URL)
+
+    def test_search_ranks_name_matches_first(self):
+        in_text, in_name, _ = self.create_recipes(3)
+        Recipe.objects.filter(pk=in_name.pk).update(name='Борщ с салом')
+        Recipe.objects.filter(pk=in_text.pk).update(
+            text='Подавать к борщу')
+        response = self.client.get(RECIPES_URL, {'search': 'БОРЩ'})
+        self.assertEqual(self.result_ids(response), [in_name.id, in_text.id])
+        response = self.client.get(RECIPES_URL, {'search': 'солянка'})
+        self.assertEqual(self.result_ids(response), [])
+
+    def test_search_rejects_cursor_pagination(self):
+        self.create_recipes(2)
+        asgi = AsyncClient(HTTP_AUTHORIZATION=f'Token {self.token}')
+        for params in ({'search': 'Рецепт', 'pagination': 'cursor'},
+                       {'search': 'Рецепт', 'cursor': 'MHwxfDE='}):
+            with self.subTest(params=params):
+                response = self.client.get(RECIPES_URL, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('pagination', response.data)
+                response = async_to_sync(asgi.get)(RECIPES_URL, params)
+                self.assertEqual(response.status_code, 400)
+        response = self.client.get(
+            RECIPES_URL, {'search': '', 'pagination': 'cursor'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_tags_match_any_or_all(self):
+        untagged, first, both = self.create_recipes(3)
+        untagged.tags.set(self.tags[2:])
+        first.tags.set(self.tags[:1])
+        both.tags.set(self.tags[:2])
+        slugs = {'tags': [tag.slug for tag in self.tags[:2]]}
+        response = self.client.get(RECIPES_URL, slugs)
+        self.assertEqual(self.result_ids(response), [both.id, first.id])
+        response = self.client.get(
+            RECIPES_URL, {**slugs, 'tags_match': 'all'})
+        self.assertEqual(self.result_ids(response), [both.id])
+
+    def test_tags_answer_not_modified(self):
+        response = self.anonymous.get(TAGS_URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 3)
+        etag = response['ETag']
+        response = self.anonymous.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name='Новый', color='#FFFFFF', slug='new')
+        response = self.anonymous.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()), 4)
+
+    def test_ingredient_name_ranks_prefix_before_contains(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for name in ('Сахарная пудра', 'сахар', 'Ванильный сахар',
+                         'Тростниковый САХАР', 'Сахарин', 'Соль'):
+                Ingredient.objects.create(name=name, measurement_unit='г')
+        response = self.anonymous.get(INGREDIENTS_URL, {'name': 'САХ'})
+        self.assertEqual(
+            [ingredient['name'] for ingredient in response.data],
+            ['сахар', 'Сахарин', 'Сахарная пудра',
+             'Ванильный сахар', 'Тростниковый САХАР'])
+        response = self.anonymous.get(
+            INGREDIENTS_URL, {'name': 'сах', 'limit': 4})
+        self.assertEqual(
+            [ingredient['name'] for ingredient in response.data],
+            ['сахар', 'Сахарин', 'Сахарная пудра', 'Ванильный сахар'])
+        response = self.anonymous.get(INGREDIENTS_URL, {'name': 'перец'})
+        self.assertEqual(response.data, [])
+        response = self.anonymous.get(
+            INGREDIENTS_URL, {'name': 'сах', 'limit': 'много'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_ingredient_index_grows_linearly_with_names(self):
+        with open(INGREDIENTS_CSV, encoding='utf-8') as file:
+            rows = [
+                {'id': index, 'name': row['name'],
+                 'measurement_unit': row['measurement_unit']}
+                for index, row in enumerate(csv.DictReader(file), start=1)
+            ]
+        keys, _, suffix_rows, suffix_positions = IngredientIndex._build(rows)
+        total_length = sum(len(key) for key in keys)
+        self.assertEqual(len(suffix_rows), total_length - len(keys))
+        self.assertLess(
+            sys.getsizeof(suffix_rows) + sys.getsizeof(suffix_positions),
+            8 * total_length)
+        result = IngredientIndex._search(
+            keys, rows, suffix_rows, suffix_positions, 'ВАРЕНЬЕ', 5)
+        self.assertEqual(len(result), 5)
+        self.assertTrue(all('варенье' in row['name'] for row in result))
+
+    def test_ingredients_answer_not_modified(self):
+        for params in ({}, {'name': 'ингредиент 1'}):
+            with self.subTest(params=params):
+                response = self.anonymous.get(INGREDIENTS_URL, params)
+                self.assertEqual(response.status_code, 200)
+                response = self.anonymous.get(
+                    INGREDIENTS_URL, params,
+                    HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+
+    def test_download_sums_ingredients_in_every_format(self):
+        for recipe in self.create_recipes(2, ingredients=2):
+            ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        first, second = self.ingredients[:2]
+        expected = {
+            'txt': (
+                'Список ингредиентов:'
+                f'\n{first.name} 20 г\n{second.name} 20 г'),
+            'csv': (
+                'name,amount,measurement_unit\r\n'
+                f'{first.name},20,г\r\n{second.name},20,г\r\n'),
+            'json': [
+                {'name': first.name, 'amount': 20, 'measurement_unit': 'г'},
+                {'name': second.name, 'amount': 20, 'measurement_unit': 'г'},
+            ],
+        }
+        for file_type, content in expected.items():
+            with self.subTest(file_type=file_type):
+                response = self.client.get(DOWNLOAD_URL, {'type': file_type})
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(
+                    f'shopping_list.{file_type}',
+                    response['Content-Disposition'])
+                body = b''.join(response.streaming_content).decode()
+                if file_type == 'json':
+                    body = json.loads(body)
+                self.assertEqual(body, content)
+        response = self.client.get(DOWNLOAD_URL, {'type': 'pdf'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_endpoints_report_status_per_id(self):
+        first, second = self.create_recipes(2)
+        missing = second.id + 1
+        url = f'{RECIPES_URL}favorite/'
+        Favorite.objects.create(user=self.user, recipe=first)
+        response = self.client.post(
+            url, {'ids': [first.id, second.id, missing, second.id]},
+            format='json')
+        self.assertEqual(response.data, [
+            {'id': first.id, 'status': BULK_EXISTS},
+            {'id': second.id, 'status': BULK_ADDED},
+            {'id': missing, 'status': BULK_NOT_FOUND},
+        ])
+        response = self.client.delete(
+            url, {'ids': [second.id, missing]}, format='json')
+        self.assertEqual(response.data, [
+            {'id': second.id, 'status': BULK_REMOVED},
+            {'id': missing, 'status': BULK_NOT_FOUND},
+        ])
+        response = self.client.post(url, {'ids': []}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_counters_follow_api_changes(self):
+        recipe, = self.create_recipes()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 1)
+        for action, counter in (('favorite', 'favorites_count'),
+                                ('shopping_cart', 'shopping_cart_count')):
+            with self.subTest(action=action):
+                url = f'{RECIPES_URL}{recipe.id}/{action}/'
+                self.assertEqual(self.client.post(url).status_code, 201)
+                recipe.refresh_from_db()
+                self.assertEqual(getattr(recipe, counter), 1)
+                self.assertEqual(self.client.delete(url).status_code, 204)
+                recipe.refresh_from_db()
+                self.assertEqual(getattr(recipe, counter), 0)
+        url = f'/api/users/{self.author.id}/subscribe/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 1)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 0)
+
+    def anonymous_list(self):
+        response = self.anonymous.get(RECIPES_URL)
+        return response['X-Cache'], response.data['results'][0]
+
+    def test_anonymous_cache_follows_favorites_and_authors(self):
+        recipe, = self.create_recipes()
+        self.assertEqual(self.anonymous_list()[0], 'MISS')
+        for method, data, count in (
+                ('post', None, 1), ('delete', None, 0),
+                ('post', {'ids': [recipe.id]}, 1),
+                ('delete', {'ids': [recipe.id]}, 0)):
+            url = f'{RECIPES_URL}{recipe.id}/favorite/'
+            if data:
+                url = f'{RECIPES_URL}favorite/'
+            with self.subTest(method=method, url=url):
+                with self.captureOnCommitCallbacks(execute=True):
+                    getattr(self.client, method)(url, data, format='json')
+                state, data = self.anonymous_list()
+                self.assertEqual(state, 'MISS')
+                self.assertEqual(data['favorites_count'], count)
+        author = User.objects.get(pk=self.author.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            author.last_login = author.date_joined
+            author.set_password('new-Password-1')
+            author.save()
+        self.assertEqual(self.anonymous_list()[0], 'HIT')
+        with self.captureOnCommitCallbacks(execute=True):
+            author.first_name = 'Мария'
+            author.save()
+        state, data = self.anonymous_list()
+        self.assertEqual(state, 'MISS')
+        self.assertEqual(data['author']['first_name'], 'Мария')
+
+    def test_membership_queries_read_a_single_table(self):
+        for kind, query in MEMBERSHIP_QUERIES.items():
+            with self.subTest(kind=kind):
+                sql = str(query(self.user.id).query).upper()
+                self.assertNotIn('JOIN', sql)
+                self.assertNotIn('ORDER BY', sql)
+
+    def test_late_membership_write_does_not_hide_changes(self):
+        recipe, = self.create_recipes()
+        query = MEMBERSHIP_QUERIES[FAVORITES]
+
+        def favorite_while_loading(user_id):
+            ids = list(query(user_id))
+            Favorite.objects.create(user=self.user, recipe=recipe)
+            return ids
+
+        url = f'{RECIPES_URL}{recipe.id}/'
+        with mock.patch.dict(
+                MEMBERSHIP_QUERIES, {FAVORITES: favorite_while_loading}):
+            response = self.client.get(url)
+        self.assertFalse(response.data['is_favorited'])
+        response = self.client.get(url)
+        self.assertTrue(response.data['is_favorited'])
+
+    def variants_exist(self, name):
+        return [
+            default_storage.exists(variant)
+            for widths in variant_names(name).values()
+            for variant in widths.values()
+        ]
+
+    def generate_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('generate_image_variants', stdout=StringIO())
+
+    def test_image_variants_are_built_by_the_worker(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.author_client.post(
+                RECIPES_URL,
+                {**self.recipe_data(), 'image': base64_png()},
+                format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.data['image_variants'], {})
+        recipe = Recipe.objects.get(pk=response.data['id'])
+        self.assertFalse(recipe.image_variants_ready)
+        for callback in callbacks:
+            callback()
+        recipe.refresh_from_db()
+        self.assertFalse(recipe.image_variants_ready)
+        self.generate_variants()
+        recipe.refresh_from_db()
+        self.assertTrue(recipe.image_variants_ready)
+        self.assertEqual(set(self.variants_exist(recipe.image.name)), {True})
+        response = self.client.get(f'{RECIPES_URL}{recipe.id}/')
+        self.assertEqual(
+            set(response.data['image_variants']), {'webp', 'jpeg'})
+
+    def test_replacing_image_rebuilds_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.author_client.post(
+                RECIPES_URL,
+                {**self.recipe_data(), 'image': base64_png()},
+                format='json')
+        self.generate_variants()
+        recipe = Recipe.objects.get(pk=response.data['id'])
+        previous = recipe.image.name
+        self.assertTrue(recipe.image_variants_ready)
+        url = f'{RECIPES_URL}{recipe.id}/'
+        data = {**self.recipe_data(), 'image': base64_png((10, 20, 30))}
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.author_client.patch(url, data, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['image_variants'], {})
+        recipe.refresh_from_db()
+        self.assertNotEqual(recipe.image.name, previous)
+        self.assertFalse(recipe.image_variants_ready)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(set(self.variants_exist(previous)), {False})
+        self.generate_variants()
+        recipe.refresh_from_db()
+        self.assertTrue(recipe.image_variants_ready)
+        self.assertEqual(set(self.variants_exist(recipe.image.name)), {True})
+
+    def test_empty_or_invalid_ids_are_rejected(self):
+        self.create_recipes(3)
+        asgi = AsyncClient(HTTP_AUTHORIZATION=f'Token {self.token}')
+        for ids in ('', ',', '1,', 'abc', ','.join(map(str, range(1, 102)))):
+            with self.subTest(ids=ids):
+                response = self.client.get(RECIPES_URL, {'ids': ids})
+                self.assertEqual(response.status_code, 400)
+                response = async_to_sync(asgi.get)(RECIPES_URL, {'ids': ids})
+                self.assertEqual(response.status_code, 400)
+
+    def upload(self, content=None):
+        response = self.author_client.post(
+            UPLOAD_URL,
+            {'file': SimpleUploadedFile('photo.png', content or png())},
+            format='multipart')
+        self.assertEqual(response.status_code, 201, response.content)
+        token = response.data['image_token']
+        return token, f'recipes/media/uploads/{token}.png'
+
+    def test_upload_token_is_released_after_commit(self):
+        token, staged = self.upload()
+        data = {**self.recipe_data(), 'image_token': token}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.author_client.post(
+                RECIPES_URL, data, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        recipe = Recipe.objects.get(pk=response.data['id'])
+        with recipe.image.open() as image:
+            self.assertEqual(image.read(), png())
+        self.assertFalse(default_storage.exists(staged))
+        response = self.author_client.post(RECIPES_URL, data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image_token', response.data)
+
+    def test_upload_survives_rolled_back_recipe(self):
+        token, staged = self.upload()
+        data = {**self.recipe_data(), 'image_token': token}
+        with mock.patch(
+                'recipes.serializers.ingredient_amount_create',
+                side_effect=DatabaseError), \
+                self.captureOnCommitCallbacks(execute=True), \
+                self.assertRaises(DatabaseError):
+            self.author_client.post(RECIPES_URL, data, format='json')
+        self.assertFalse(Recipe.objects.exists())
+        self.assertTrue(default_storage.exists(staged))
+        cache.delete(f'image_upload:{token}:claim')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.author_client.post(
+                RECIPES_URL, data, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertFalse(default_storage.exists(staged))
+
+    def test_upload_rejects_decompression_bombs(self):
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 100):
+            response = self.author_client.post(
+                UPLOAD_URL,
+                {'file': SimpleUploadedFile('bomb.png', png())},
+                format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('file', response.data)
+
+
+class MetricsTest(RecipeAPITestCase):
+    labels = 'method="GET",route="api/recipes/",status="200"'
+
+    def setUp(self):
+        super().setUp()
+        registry.flush()
+        caches['metrics'].clear()
+
+    def observe(self, registry, labels=('GET', 'api/recipes/', '200')):
+        registry.observe(
+            labels, {'duration': 0.02, 'queries': 3, 'size': 500},
+            {'db_time': 0.5})
+
+    def test_registry_flush_merges_processes(self):
+        first, second = MetricsRegistry(), MetricsRegistry()
+        self.observe(first)
+        self.observe(first)
+        self.assertIsNone(caches['metrics'].get(SERIES_COUNT))
+        first.flush()
+        self.observe(second)
+        second.flush()
+        self.assertEqual(caches['metrics'].get(SERIES_COUNT), 1)
+        self.assertEqual(first.pending, {})
+        self.assertIn(
+            f'foodgram_http_request_duration_seconds_count{{{self.labels}}} 3',
+            first.collect())
+
+    def test_collect_renders_prometheus_text(self):
+        metrics = MetricsRegistry()
+        self.observe(metrics)
+        self.observe(metrics)
+        lines = metrics.collect().splitlines()
+        for line in (
+            '# TYPE foodgram_http_request_duration_seconds histogram',
+            'foodgram_http_request_duration_seconds_bucket'
+            f'{{{self.labels},le="0.01"}} 0',
+            'foodgram_http_request_duration_seconds_bucket'
+            f'{{{self.labels},le="0.025"}} 2',
+            'foodgram_http_request_duration_seconds_bucket'
+            f'{{{self.labels},le="+Inf"}} 2',
+            f'foodgram_http_request_duration_seconds_sum{{{self.labels}}} '
+            '0.04',
+            f'foodgram_http_request_db_queries_sum{{{self.labels}}} 6',
+            f'foodgram_http_response_size_bytes_count{{{self.labels}}} 2',
+            '# TYPE foodgram_http_request_db_duration_seconds_total counter',
+            'foodgram_http_request_db_duration_seconds_total'
+            f'{{{self.labels}}} 1.0',
+        ):
+            self.assertIn(line, lines)
+
+    def test_collect_escapes_label_values(self):
+        metrics = MetricsRegistry()
+        self.observe(metrics, ('GET', 'a"b\\c\nd', '200'))
+        self.assertIn(
+            'route="a\\"b\\\\c\\nd"', metrics.collect())
+
+    def test_labels_are_bounded_per_route(self):
+        metrics = MetricsRegistry()
+        self.observe(metrics, ('BREW', 'api/recipes/', '200'))
+        for status in range(400, 410):
+            self.observe(metrics, ('GET', 'api/recipes/', str(status)))
+        self.assertEqual(
+            {labels[0] for labels in metrics.series}, {'GET', 'OTHER'})
+        self.assertEqual(
+            sorted(labels[2] for labels in metrics.series
+                   if labels[0] == 'GET'),
+            ['400', '401', '402', '403', '404', '4xx'])
+
+    def test_streaming_response_size_is_recorded(self):
+        recipe, = self.create_recipes()
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        response = self.client.get(DOWNLOAD_URL)
+        size = len(b''.join(response.streaming_content))
+        response.close()
+        self.assertIn(
+            'foodgram_http_response_size_bytes_sum{method="GET",'
+            'route="api/recipes/download_shopping_cart/",status="200"} '
+            f'{size}', registry.collect().splitlines())
+
+    def test_metrics_require_admin_or_internal_host(self):
+        self.assertEqual(self.anonymous.get(METRICS_URL).status_code, 401)
+        self.assertEqual(self.client.get(METRICS_URL).status_code, 403)
+        with override_settings(METRICS_ALLOWED_IPS=['127.0.0.1']):
+            response = self.anonymous.get(METRICS_URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        self.assertEqual(self.client.get(METRICS_URL).status_code, 200)
@@ -5,6 +5,7 @@ from .views import (TagViewSet,
                     IngredientViewSet,
                     RecipeViewSet,
                     DownloadShoppingCartAPIView,
+                    RecipeImageUploadAPIView,
                     SubAPIView,
                     SubViewSet)
 
@@ -18,6 +19,8 @@ urlpatterns = [
          SubViewSet.as_view({'get': 'list'})),
     path('recipes/download_shopping_cart/',
          DownloadShoppingCartAPIView.as_view()),
+    path('recipes/images/',
+         RecipeImageUploadAPIView.as_view()),
     path('users/<int:pk>/subscribe/',
          SubAPIView.as_view()),
     path('', include(router.urls))
@@ -1,34 +1,70 @@
+import csv
+import json
+
 from rest_framework import viewsets, permissions
 from rest_framework.decorators import action
+from rest_framework.parsers import FileUploadParser, MultiPartParser
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.views import APIView
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import (Exists,
+                              F,
+                              OuterRef,
+                              Prefetch,
+                              Sum,
+                              prefetch_related_objects)
+from django.http import StreamingHttpResponse
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 
-from core.filters import CustomFilterIngredient, CustomFlterRecipeTags
+from core.consts import (BULK_ADDED,
+                         BULK_EXISTS,
+                         BULK_NOT_FOUND,
+                         BULK_REMOVED,
+                         FAVORITES,
+                         FOLLOWING,
+                         IMAGE_UPLOAD_MAX_SIZE,
+                         INGREDIENTS_VERSION,
+                         RECIPES_VERSION,
+                         SHOPPING_CART,
+                         TAGS_VERSION)
+from core.filters import CustomFlterRecipeTags
+from core.membership import invalidate_member_ids
+from core.mixins import (AnonymousCache,
+                         AnonymousCacheMixin,
+                         VersionedListMixin,
+                         VersionedPayload)
+from core.pagination import RecipePagination
 from core.permissions import OwnerOrReadOnly
+from core.versions import bump_version
 from users.models import Subscribe
 from .models import (Tag,
                      Ingredient,
                      Recipe,
                      Favorite,
-                     ShoppingCart)
+                     ShoppingCart,
+                     IngredientAmount,
+                     recipe_prefetches)
+from .counters import recount_after
+from .images import store_upload
+from .ingredient_index import ingredient_index
 from .serializers import (TagSerializer,
                           IngredientSerializer,
                           RecipeSerializer,
                           RecipeListSerializer,
                           FavoriteSerializer,
-                          SubscribeUserSerializer,
-                          SubscribeUserSerializerPres)
+                          RecipeIdsSerializer,
+                          SubscribeUserSerializer)
 
 
 User = get_user_model()
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(VersionedListMixin, viewsets.ReadOnlyModelViewSet):
+    version_name = TAGS_VERSION
+    payload = VersionedPayload()
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
@@ -36,55 +72,158 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ('name',)
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(VersionedListMixin, viewsets.ReadOnlyModelViewSet):
+    version_name = INGREDIENTS_VERSION
+    payload = VersionedPayload()
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
     permission_classes = (permissions.AllowAny,)
-    filter_backends = (DjangoFilterBackend,)
-    filterset_class = CustomFilterIngredient
     search_fields = ('name',)
 
+    def get_list_response(self, request, version, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name is None:
+            return super().get_list_response(
+                request, version, *args, **kwargs)
+        limit = request.query_params.get('limit')
+        if limit is not None:
+            if not limit.isdigit():
+                return Response(status=status.HTTP_400_BAD_REQUEST)
+            limit = int(limit)
+        return Response(ingredient_index.search(name, limit))
+
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AnonymousCacheMixin, viewsets.ModelViewSet):
+    anonymous_cache = AnonymousCache(
+        'recipes', (RECIPES_VERSION, TAGS_VERSION, INGREDIENTS_VERSION))
     queryset = Recipe.objects.all()
     permission_classes = (OwnerOrReadOnly, )
     filter_backends = (DjangoFilterBackend, )
     filterset_class = CustomFlterRecipeTags
+    pagination_class = RecipePagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('favorite', 'shopping_cart', 'destroy'):
+            return queryset
+        return queryset.with_related()
 
     def get_serializer_class(self):
         if self.action in ('list',):
             return RecipeListSerializer
+        if self.action in ('favorite_bulk', 'shopping_cart_bulk'):
+            return RecipeIdsSerializer
         return RecipeSerializer
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
+        self._refresh_instance(serializer)
+
+    def update(self, request, *args, **kwargs):
+        serializer = self.get_serializer(
+            self.get_object(), data=request.data,
+            partial=kwargs.pop('partial', False))
+        serializer.is_valid(raise_exception=True)
+        self.perform_update(serializer)
+        return Response(serializer.data)
+
+    def perform_update(self, serializer):
+        serializer.save()
+        self._refresh_instance(serializer)
+
+    @staticmethod
+    def _refresh_instance(serializer):
+        recipe = serializer.instance
+        recipe._prefetched_objects_cache = {}
+        prefetch_related_objects([recipe], *recipe_prefetches())
 
     @action(methods=['post', 'delete'], detail=True, url_path='favorite')
     def favorite(self, request, pk):
         recipe = get_object_or_404(Recipe, pk=pk)
+        favorite = request.user.favorite.all().filter(recipe=recipe)
         if request.method == 'POST':
-            return self._create_obj(
+            response = self._create_obj(
                 Favorite,
                 request.user,
                 recipe,
-                request.user.favorite.all().filter(recipe=recipe))
+                favorite)
         if request.method == 'DELETE':
-            favorite = request.user.favorite.all().filter(recipe=recipe)
-            return self._delete_obj(favorite)
+            response = self._delete_obj(favorite)
+        invalidate_member_ids(request.user.id, FAVORITES, request)
+        return response
 
     @action(methods=['post', 'delete'], detail=True, url_path='shopping_cart')
     def shopping_cart(self, request, pk):
         recipe = get_object_or_404(Recipe, pk=pk)
+        shopping_cart = request.user.cart.all().filter(recipe=recipe)
         if request.method == 'POST':
-            return self._create_obj(
+            response = self._create_obj(
                 ShoppingCart,
                 request.user,
                 recipe,
-                request.user.cart.all().filter(recipe=recipe))
+                shopping_cart)
         if request.method == 'DELETE':
-            shopping_cart = request.user.cart.all().filter(recipe=recipe)
-            return self._delete_obj(shopping_cart)
+            response = self._delete_obj(shopping_cart)
+        invalidate_member_ids(request.user.id, SHOPPING_CART, request)
+        return response
+
+    @action(methods=['post', 'delete'], detail=False, url_path='favorite')
+    def favorite_bulk(self, request):
+        response = self._bulk_change(
+            request, Favorite, FAVORITES, 'favorites_count')
+        if any(item['status'] in (BULK_ADDED, BULK_REMOVED)
+               for item in response.data):
+            bump_version(RECIPES_VERSION)
+        return response
+
+    @action(methods=['post', 'delete'], detail=False,
+            url_path='shopping_cart')
+    def shopping_cart_bulk(self, request):
+        return self._bulk_change(
+            request, ShoppingCart, SHOPPING_CART, 'shopping_cart_count')
+
+    def _bulk_change(self, request, model, kind, counter):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        if request.method == 'POST':
+            results = self._bulk_add(request.user, model, counter, ids)
+        else:
+            results = self._bulk_remove(request.user, model, counter, ids)
+        invalidate_member_ids(request.user.id, kind, request)
+        return Response(
+            [{'id': pk, 'status': results[pk]} for pk in ids])
+
+    @staticmethod
+    def _bulk_add(user, model, counter, ids):
+        found = dict(Recipe.objects.filter(pk__in=ids).annotate(
+            present=Exists(model.objects.filter(
+                user=user, recipe_id=OuterRef('pk')))
+        ).values_list('pk', 'present'))
+        added = [pk for pk in ids if pk in found and not found[pk]]
+        with transaction.atomic(), recount_after(
+                Recipe, added, counter, model, 'recipe'):
+            model.objects.bulk_create(
+                [model(user=user, recipe_id=pk) for pk in added],
+                ignore_conflicts=True)
+        return {
+            pk: BULK_NOT_FOUND if pk not in found
+            else BULK_EXISTS if found[pk] else BULK_ADDED
+            for pk in ids
+        }
+
+    @staticmethod
+    def _bulk_remove(user, model, counter, ids):
+        entries = model.objects.filter(user=user, recipe_id__in=ids)
+        removed = set(entries.values_list('recipe_id', flat=True))
+        with transaction.atomic(), recount_after(
+                Recipe, removed, counter, model, 'recipe'):
+            entries.delete()
+        return {
+            pk: BULK_REMOVED if pk in removed else BULK_NOT_FOUND
+            for pk in ids
+        }
 
     @staticmethod
     def _create_obj(cls, user, recipe, queryset):
@@ -102,31 +241,110 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
 
+class RecipeImageUploadAPIView(APIView):
+    parser_classes = (MultiPartParser, FileUploadParser)
+
+    def post(self, request):
+        file = request.data.get('file') or request.data.get('image')
+        if file is None:
+            return Response(
+                {'file': ['Файл не передан']},
+                status=status.HTTP_400_BAD_REQUEST)
+        if file.size > IMAGE_UPLOAD_MAX_SIZE:
+            return Response(
+                {'file': ['Файл слишком большой']},
+                status=status.HTTP_400_BAD_REQUEST)
+        upload = store_upload(file, request.user)
+        if upload is None:
+            return Response(
+                {'file': ['Файл не является изображением']},
+                status=status.HTTP_400_BAD_REQUEST)
+        token, url = upload
+        return Response(
+            {'image_token': token, 'image': request.build_absolute_uri(url)},
+            status=status.HTTP_201_CREATED)
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def shopping_cart_totals(user):
+    return IngredientAmount.objects.filter(
+        recipe__cart__user=user
+    ).values(
+        name=F('ingredient__name'),
+        measurement_unit=F('ingredient__measurement_unit')
+    ).annotate(
+        total_amount=Sum('amount')
+    ).order_by('name')
+
+
 class DownloadShoppingCartAPIView(APIView):
+    content_types = {
+        'txt': 'text/plain',
+        'csv': 'text/csv',
+        'json': 'application/json',
+    }
+
     def get(self, request):
-        ingredient_dict = {}
-        cart = request.user.cart.all()
-        for product in cart:
-            recipe = Recipe.objects.get(id=product.recipe.id)
-            ingredient_amount = recipe.full_ingredient.all()
-            self._group_amounts_by_ingredient(
-                ingredient_amount,
-                ingredient_dict)
-        content = 'Список ингредиентов:'
-        for (name, unit), amount in ingredient_dict.items():
-            content = content + f'\n{name} {amount} {unit}'
-        response = HttpResponse(content, content_type='text/plain')
-        response['Content-Disposition'] = 'attachment'
+        file_type = request.query_params.get('type', 'txt')
+        if file_type not in self.content_types:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        ingredients = list(shopping_cart_totals(request.user))
+        return self.get_file_response(
+            file_type, self.get_content(file_type, ingredients))
+
+    @classmethod
+    def get_content(cls, file_type, ingredients):
+        return getattr(cls, f'_{file_type}_content')(ingredients)
+
+    @classmethod
+    def get_file_response(cls, file_type, content):
+        response = StreamingHttpResponse(
+            content,
+            content_type=cls.content_types[file_type])
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{file_type}"')
         return response
 
     @staticmethod
-    def _group_amounts_by_ingredient(ingr_amount, ingredient_dict):
-        for ingredient_amount in ingr_amount:
-            ingredient = Ingredient.objects.get(
-                id=ingredient_amount.ingredient.id)
-            key = (ingredient.name, ingredient.measurement_unit)
-            ingredient_dict[key] = (
-                ingredient_dict.get(key, 0) + ingredient_amount.amount)
+    def _txt_content(ingredients):
+        yield 'Список ингредиентов:'
+        for item in ingredients:
+            yield (f'\n{item["name"]} {item["total_amount"]} '
+                   f'{item["measurement_unit"]}')
+
+    @staticmethod
+    def _csv_content(ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'amount', 'measurement_unit'))
+        for item in ingredients:
+            yield writer.writerow((
+                item['name'],
+                item['total_amount'],
+                item['measurement_unit']))
+
+    @staticmethod
+    def _json_content(ingredients):
+        yield '['
+        for index, item in enumerate(ingredients):
+            yield (',' if index else '') + json.dumps(
+                {'name': item['name'],
+                 'amount': item['total_amount'],
+                 'measurement_unit': item['measurement_unit']},
+                ensure_ascii=False)
+        yield ']'
+
+
+def authors_with_recipes(authors, limit=None):
+    recipes = Recipe.objects.only(
+        'id', 'name', 'image', 'image_variants_ready', 'cooking_time',
+        'author')
+    if limit is not None:
+        recipes = recipes.limit_per_author(limit)
+    return authors.prefetch_related(Prefetch('recipes', queryset=recipes))
 
 
 class SubAPIView(APIView):
@@ -138,12 +356,16 @@ class SubAPIView(APIView):
                 and not user.current_user.all().filter(
                     author=to_user).exists()):
                 Subscribe.objects.create(user=user, author=to_user)
+                invalidate_member_ids(user.id, FOLLOWING, request)
                 limit = request.query_params.get('recipes_limit', None)
-                context = {}
+                context = {'request': request}
                 if limit:
                     context['limit'] = int(limit)
-                serializer = SubscribeUserSerializerPres(to_user,
-                                                         context=context)
+                to_user = authors_with_recipes(
+                    User.objects.filter(pk=to_user.pk),
+                    context.get('limit')).get()
+                serializer = SubscribeUserSerializer(to_user,
+                                                     context=context)
                 return Response(status=status.HTTP_201_CREATED,
                                 data=serializer.data)
 
@@ -156,6 +378,7 @@ class SubAPIView(APIView):
             subs = user.current_user.all().filter(author=to_user)
             if user != to_user and subs.exists():
                 subs.delete()
+                invalidate_member_ids(user.id, FOLLOWING, request)
                 return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
@@ -166,13 +389,11 @@ class SubViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         limit = self.request.query_params.get('recipes_limit', None)
-        queryset = user.current_user.all()
         if limit:
             self.limit = int(limit)
-        res = []
-        for sub_user in queryset:
-            res.append(sub_user.author)
-        return res
+        return authors_with_recipes(
+            User.objects.filter(recipe_author__user=user),
+            getattr(self, 'limit', None)).order_by('username')
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
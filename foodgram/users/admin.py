@@ -1,6 +1,30 @@
 from django.contrib import admin
 
-from .models import User
+from core.pagination import ApproximateCountPaginator
+from .models import Subscribe, User
 
 
-admin.site.register(User)
+@admin.register(User)
+class UserAdmin(admin.ModelAdmin):
+    list_display = (
+        'username',
+        'email',
+        'first_name',
+        'last_name',
+        'recipes_count',
+        'followers_count'
+    )
+    search_fields = ('^username', '^email')
+    readonly_fields = ('recipes_count', 'followers_count')
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(Subscribe)
+class SubscribeAdmin(admin.ModelAdmin):
+    list_display = ('user', 'author')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    search_fields = ('^user__username', '^author__username')
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
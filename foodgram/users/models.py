@@ -1,5 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import OpClass
+from django.db.models.functions import Upper
 from django.core.validators import RegexValidator
 
 username_validator = RegexValidator(
@@ -42,11 +44,31 @@ class User(AbstractUser):
         verbose_name='Пароль',
         help_text='Введите пароль'
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество рецептов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество подписчиков'
+    )
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'password']
 
     class Meta:
         ordering = ['username']
+        indexes = (
+            models.Index(
+                OpClass(Upper('username'), name='text_pattern_ops'),
+                name='user_username_upper_idx',
+            ),
+            models.Index(
+                OpClass(Upper('email'), name='text_pattern_ops'),
+                name='user_email_upper_idx',
+            ),
+        )
 
     def __str__(self):
         return f'{self.first_name} {self.last_name}'
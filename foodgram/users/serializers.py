@@ -1,5 +1,8 @@
 from rest_framework import serializers
 
+from core.consts import FOLLOWING
+from core.membership import is_member
+
 from .models import User
 
 
@@ -43,7 +46,6 @@ class CustomUserSerializerSub(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        return (user.is_authenticated
-                and user != obj
-                and user.current_user.all().filter(author=obj).exists())
+        request = self.context['request']
+        return (request.user != obj
+                and is_member(request, FOLLOWING, obj.id))
@@ -1,9 +1,10 @@
 from django.urls import path, include
 
-from .views import DjoserUserViewSet
+from .views import DjoserUserViewSet, TokenCacheStatsAPIView
 
 urlpatterns = [
     path('users/me/', DjoserUserViewSet.as_view({'get': 'me'})),
+    path('auth/token/stats/', TokenCacheStatsAPIView.as_view()),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken'))
 ]
@@ -1,6 +1,10 @@
 from djoser.views import UserViewSet
 from rest_framework.pagination import LimitOffsetPagination
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.authentication import token_cache_stats
 
 
 class DjoserUserViewSet(UserViewSet):
@@ -11,3 +15,10 @@ class DjoserUserViewSet(UserViewSet):
         response = super().me(request, *args, **kwargs)
         response.data['is_subscribed'] = False
         return response
+
+
+class TokenCacheStatsAPIView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(token_cache_stats())